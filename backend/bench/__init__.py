@@ -0,0 +1,20 @@
+"""Reproducible benchmarks and load tests; run them from the backend directory.
+
+Each script works on a throwaway database and index in a temporary directory
+and never touches healthcare.db.
+"""
+
+import os
+import tempfile
+
+
+def scratch_environment() -> str:
+    """Point the app's storage at a temporary directory; call before importing src."""
+    directory = tempfile.mkdtemp(prefix="bench-")
+    os.environ.setdefault("DB_PATH", os.path.join(directory, "bench.db"))
+    os.environ.setdefault("RAG_INDEX_DIR", os.path.join(directory, "rag_index"))
+    os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(directory, "embeddings_cache.db"))
+    os.environ.setdefault("EMBEDDING_MODEL", "local")
+    os.environ.setdefault("SCHEDULER_ENABLED", "false")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+    return directory
@@ -0,0 +1,80 @@
+"""Per-turn write cost of a chat conversation as its history grows.
+
+Compares db.append_messages, which inserts only the new user and assistant
+message, with the previous write path that deleted every message of the
+conversation and inserted the whole history again.
+
+    uv run python -m bench.chat_writes
+    uv run python -m bench.chat_writes --sizes 100 1000 5000 --turns 50
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+from . import scratch_environment
+
+scratch_environment()
+
+from src import db  # noqa: E402
+
+
+def rewrite_conversation(username: str, conversation_id: str, messages, state):
+    """The write path before append_messages: replace every row of the conversation."""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE conversations SET state = ?, title = ? WHERE id = ? AND username = ?",
+        (json.dumps(state), None, conversation_id, username),
+    )
+    cursor.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+    for message in messages:
+        cursor.execute(
+            "INSERT INTO messages (conversation_id, role, content, timestamp, image) VALUES (?, ?, ?, ?, ?)",
+            (conversation_id, message.role, message.content, message.timestamp.isoformat(), message.image),
+        )
+    conn.commit()
+
+
+def turn(index: int):
+    now = datetime.now()
+    return [
+        db.Message(role="user", content=f"Question {index} about my blood pressure", timestamp=now),
+        db.Message(role="assistant", content=f"Answer {index} with a few sentences of advice. " * 4, timestamp=now),
+    ]
+
+
+def measure(size: int, turns: int, append: bool) -> float:
+    """Average milliseconds per turn once the conversation holds `size` messages."""
+    conversation_id = f"{'append' if append else 'rewrite'}-{size}"
+    db.create_conversation("bench", conversation_id)
+    history = [message for index in range(size // 2) for message in turn(index)]
+    db.append_messages("bench", conversation_id, history)
+
+    start = time.perf_counter()
+    for index in range(turns):
+        new_messages = turn(size + index)
+        history.extend(new_messages)
+        if append:
+            db.append_messages("bench", conversation_id, new_messages, {"turn": index})
+        else:
+            rewrite_conversation("bench", conversation_id, history, {"turn": index})
+    return 1000 * (time.perf_counter() - start) / turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-turn chat write cost by history length")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--turns", type=int, default=50)
+    args = parser.parse_args()
+
+    db.create_user(db.User(username="bench", password="bench", status="finished"))
+    print(f"{'messages':>10} {'append ms/turn':>16} {'rewrite ms/turn':>16}")
+    for size in args.sizes:
+        append = measure(size, args.turns, append=True)
+        rewrite = measure(size, args.turns, append=False)
+        print(f"{size:>10} {append:>16.3f} {rewrite:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
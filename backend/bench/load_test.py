@@ -0,0 +1,105 @@
+"""Concurrent /chat and /calendar requests against one SQLite database.
+
+Exercises the per-thread connection pool: many threads send chat turns and
+calendar reads and writes at the same time, then every stored row is counted.
+The chat model is replaced by a fixed answer so the test measures the
+database and request handling, not Bedrock.
+
+    uv run python -m bench.load_test
+    uv run python -m bench.load_test --threads 64 --requests 2000
+"""
+
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from . import scratch_environment
+
+scratch_environment()
+
+from fastapi.testclient import TestClient  # noqa: E402
+from src import api, db  # noqa: E402
+
+
+class FixedAnswerGraph:
+    async def achat(self, *args, **kwargs):
+        return "Drink some water and rest."
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /chat and /calendar load test")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--users", type=int, default=8)
+    args = parser.parse_args()
+
+    api.graph = FixedAnswerGraph()
+    api.summarization_graph = FixedAnswerGraph()
+    usernames = [f"load{index}" for index in range(args.users)]
+    for username in usernames:
+        db.create_user(db.User(username=username, password="load", status="finished"))
+
+    local = threading.local()
+    conversations = {}
+    lock = threading.Lock()
+
+    def client(username: str) -> TestClient:
+        clients = local.__dict__.setdefault("clients", {})
+        if username not in clients:
+            clients[username] = TestClient(api.app, cookies={"user": username})
+        return clients[username]
+
+    def request(index: int):
+        username = usernames[index % len(usernames)]
+        kind = random.choice(["chat", "chat", "calendar_add", "calendar_get"])
+        start = time.perf_counter()
+        if kind == "chat":
+            with lock:
+                conversation_id = conversations.get(username)
+            data = {"message": f"message {index}", "response_mode": "delta"}
+            if conversation_id:
+                data["conversation_id"] = conversation_id
+            response = client(username).post("/chat", data=data)
+            body = response.json()
+            if "conversation_id" in body:
+                with lock:
+                    conversations.setdefault(username, body["conversation_id"])
+            ok = response.status_code == 200 and "error" not in body
+        elif kind == "calendar_add":
+            response = client(username).post(
+                "/calendar/add",
+                json={
+                    "description": f"event {index}",
+                    "from_timestamp": "2026-01-01T10:00:00",
+                    "to_timestamp": "2026-01-01T11:00:00",
+                },
+            )
+            ok = response.status_code == 200
+        else:
+            response = client(username).get("/calendar/")
+            ok = response.status_code == 200
+        return kind, ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(request, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    sent = Counter(kind for kind, _, _ in results)
+    failed = Counter(kind for kind, ok, _ in results if not ok)
+    latencies = sorted(seconds for _, _, seconds in results)
+    conn = db.get_connection()
+    messages = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+    events = conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    print(f"{args.requests} requests from {args.threads} threads in {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)")
+    print(f"p50 {1000 * latencies[len(latencies) // 2]:.1f} ms, p99 {1000 * latencies[int(len(latencies) * 0.99)]:.1f} ms")
+    print(f"sent {dict(sent)}, failed {dict(failed)}")
+    print(f"messages stored {messages} (expected {2 * (sent['chat'] - failed['chat'])})")
+    print(f"events stored {events} (expected {sent['calendar_add'] - failed['calendar_add']})")
+
+
+if __name__ == "__main__":
+    main()
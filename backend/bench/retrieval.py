@@ -0,0 +1,98 @@
+"""Top-k retrieval latency of SearchEngine against langchain's InMemoryVectorStore.
+
+Random normalized vectors stand in for chunk embeddings. The exact engine is
+timed per query and batched, the IVF mode per query together with its recall
+against the exact results. InMemoryVectorStore scores every document in
+Python and needs several GB at a million chunks, so it is only run up to
+--baseline-max.
+
+    uv run python -m bench.retrieval
+    uv run python -m bench.retrieval --sizes 10000 1000000
+"""
+
+import argparse
+import time
+import numpy as np
+from . import scratch_environment
+
+scratch_environment()
+
+from langchain_core.documents import Document  # noqa: E402
+from langchain_core.embeddings import Embeddings  # noqa: E402
+from langchain_core.vectorstores import InMemoryVectorStore  # noqa: E402
+from src.rag.index import normalize  # noqa: E402
+from src.rag.search import SearchEngine  # noqa: E402
+
+
+class FixedEmbeddings(Embeddings):
+    """Hands out precomputed vectors so the store can be filled without a model."""
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[int(text)].tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[int(text)].tolist()
+
+
+def clustered_vectors(count: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((max(1, count // 500), dim))
+    return normalize(centers[rng.integers(0, len(centers), count)] + 0.3 * rng.standard_normal((count, dim)))
+
+
+def timed(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return 1000 * (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Top-k retrieval benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=64)
+    parser.add_argument("--probes", type=int, default=8)
+    parser.add_argument("--baseline-max", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        vectors = clustered_vectors(size, args.dim, rng)
+        queries = normalize(vectors[rng.integers(0, size, args.queries)] + 0.1 * rng.standard_normal((args.queries, args.dim)))
+        metadata = [{} for _ in range(size)]
+
+        exact = SearchEngine(vectors, metadata)
+        per_query = timed(lambda: [exact.search(query[None], args.k) for query in queries], 1) / args.queries
+        batched = timed(lambda: exact.search(queries, args.k), 3) / args.queries
+
+        start = time.perf_counter()
+        ivf = SearchEngine(vectors, metadata, approximate=True, probes=args.probes)
+        build = time.perf_counter() - start
+        approximate = timed(lambda: [ivf.search(query[None], args.k) for query in queries], 1) / args.queries
+        truth = exact.search(queries, args.k)
+        found = ivf.search(queries, args.k)
+        recall = np.mean([
+            len({row for row, _ in a} & {row for row, _ in b}) / args.k for a, b in zip(truth, found)
+        ])
+
+        print(f"{size} chunks, {args.dim} dimensions, k={args.k}")
+        print(f"  exact      {per_query:8.3f} ms/query")
+        print(f"  batched    {batched:8.3f} ms/query")
+        print(f"  ivf        {approximate:8.3f} ms/query, recall@{args.k} {recall:.2f}, built in {build:.1f}s")
+
+        if size <= args.baseline_max:
+            store = InMemoryVectorStore(FixedEmbeddings(vectors))
+            store.add_documents([Document(page_content=str(row)) for row in range(size)])
+            sample = queries[: max(1, min(8, args.queries))]
+            baseline = timed(lambda: [store.similarity_search_by_vector(query.tolist(), args.k) for query in sample], 1) / len(sample)
+            print(f"  in-memory  {baseline:8.3f} ms/query")
+        else:
+            print(f"  in-memory  skipped above --baseline-max={args.baseline_max}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,44 @@
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, BackgroundTasks, Request, UploadFile, Form
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, BackgroundTasks, Depends, Request, UploadFile, Form
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, List, Literal, Optional, Tuple
 from uuid import uuid4
+from contextlib import asynccontextmanager
 from datetime import datetime
-import base64
+import json
 import os
 from .state import graph, summarization_graph
 from .routes import documents, user, calendar, daily, diet, dashboard, conversations
-from .db import (
+from .db import Message, Conversation, User
+from .async_db import (
     create_conversation,
     get_conversation,
-    update_conversation,
+    append_messages,
     get_user,
-    Message,
-    Conversation,
+    get_latest_daily_answers,
 )
 from fastapi.staticfiles import StaticFiles
-from langchain_core.messages import HumanMessage, AIMessage
-from .config import logger
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from .config import CONFIG, logger
+from .images import save_upload, image_data_url
+from .user_cache import user_cache
+from .scheduler import get_job_status, start_scheduler, stop_scheduler
+from .utils import get_current_user, ingestion_worker, retriever, vector_index
+from .context import chat_daily_answers, chat_profile, estimate_text_tokens, select_history
+from .graphs.chatgraph import ChatGraph
 
 
-app = FastAPI(root_path="/api")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if CONFIG["SCHEDULER_ENABLED"]:
+        start_scheduler()
+    yield
+    stop_scheduler()
+
+
+app = FastAPI(root_path="/api", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -50,69 +66,78 @@ class ChatRequest(BaseModel):
     image: Optional[UploadFile] = None
 
 
-@app.post("/chat")
-async def chat_endpoint(
-    background_tasks: BackgroundTasks,
-    request: Request,
-    message: str = Form(...),
-    conversation_id: Optional[str] = Form(None),
-    image: Optional[UploadFile] = Form(None),
-):
-    user_id = request.cookies.get("user")
+class ChatTurn(BaseModel):
+    user: User
+    conversation: Conversation
+    new_messages: List[Message]
+
+
+async def start_turn(
+    user_id: Optional[str],
+    message: str,
+    conversation_id: Optional[str],
+    image: Optional[UploadFile],
+) -> Tuple[Optional[ChatTurn], Optional[str]]:
+    """Validate a chat request and load its conversation with the new user message appended."""
     if user_id is None:
         logger.warning(f"User {user_id} not found")
-        return {"error": "User not found"}
+        return None, "User not found"
 
-    user = get_user(user_id)
+    user = await get_user(user_id)
     if user is None:
         logger.warning(f"User {user_id} not found")
-        return {"error": "User not found"}
+        return None, "User not found"
 
     conversation_id = conversation_id or ""
 
     if not message and not image:
         logger.warning("Received empty message and no image")
-        return {"error": "No message or image provided"}
+        return None, "No message or image provided"
 
     image_path = None
     if image:
         image_content = await image.read()
-        # Generate unique filename
-        if image.filename and "." in image.filename:
-            ext = image.filename.split(".")[-1]
-        else:
-            ext = "jpg"
-        filename = f"{uuid4()}.{ext}"
-        image_path = f"uploads/{filename}"
-        with open(image_path, "wb") as f:
-            f.write(image_content)
+        try:
+            image_path = await save_upload(image_content)
+        except Exception as e:
+            logger.warning(f"Rejected image upload: {e}")
+            return None, "Invalid image"
 
     if not conversation_id:
         conversation_id = str(uuid4())
-        create_conversation(user_id, conversation_id)
+        await create_conversation(user_id, conversation_id)
         logger.info(f"New conversation started for user {user_id}: {conversation_id}")
 
-    conv = get_conversation(user_id, conversation_id)
+    conv = await get_conversation(user_id, conversation_id)
     if conv is None:
-        create_conversation(user_id, conversation_id)
-        conv = get_conversation(user_id, conversation_id)
+        await create_conversation(user_id, conversation_id)
+        conv = await get_conversation(user_id, conversation_id)
     if conv is None:
         conv = Conversation(id=conversation_id)
-    history = conv.messages
 
-    history.append(
-        Message(
-            role="user", content=message, timestamp=datetime.now(), image=image_path
-        )
+    user_msg = Message(
+        role="user", content=message, timestamp=datetime.now(), image=image_path
     )
+    conv.messages.append(user_msg)
+    return ChatTurn(user=user, conversation=conv, new_messages=[user_msg]), None
+
+
+async def to_langchain_messages(history: List[Message]) -> List[BaseMessage]:
+    """Convert stored messages for the model.
+
+    Only images from the last CHAT_IMAGE_TURNS user messages are attached;
+    older ones are replaced by a short text placeholder.
+    """
+    user_turns = [i for i, msg in enumerate(history) if msg.role == "user"]
+    image_turns = set(user_turns[-CONFIG["CHAT_IMAGE_TURNS"]:]) if CONFIG["CHAT_IMAGE_TURNS"] > 0 else set()
 
     messages = []
-    for msg in history:
+    for i, msg in enumerate(history):
         if msg.role == "user":
-            if msg.image:
-                with open(msg.image, "rb") as f:
-                    image_content = f.read()
-                image_url = f"data:image/jpeg;base64,{base64.b64encode(image_content).decode('utf-8')}"
+            if msg.image and i not in image_turns:
+                content = f"{msg.content}\n[An image was attached to this message]"
+            elif msg.image:
+                image_url = await image_data_url(msg.image)
                 content = [
                     {"type": "text", "text": msg.content},
                     {"type": "image_url", "image_url": {"url": image_url}},
@@ -122,17 +147,14 @@ async def chat_endpoint(
             messages.append(HumanMessage(content=content))
         else:
             messages.append(AIMessage(content=msg.content))
+    return messages
 
-    try:
-        logger.debug(f"Passing context for user {user_id}")
-        response = graph.chat(messages, user)
-    except Exception as e:
-        logger.error(f"Error processing message: {e}")
-        return {"error": "Internal server error"}
 
-    response_text = (
-        response.get("response", response) if isinstance(response, dict) else response
-    )
+async def finish_turn(turn: ChatTurn, response_text: Optional[str]) -> Optional[Message]:
+    """Persist the user message and assistant reply of a turn and return the reply."""
+    conv = turn.conversation
+    history = conv.messages
+    assistant_msg = None
 
     if response_text:
         assistant_msg = Message(
@@ -141,8 +163,9 @@ async def chat_endpoint(
             timestamp=datetime.now(),
         )
         history.append(assistant_msg)
+        turn.new_messages.append(assistant_msg)
         logger.debug(
-            f"Assistant response sent for user {user_id}, conversation {conversation_id}"
+            f"Assistant response sent for user {turn.user.username}, conversation {conv.id}"
         )
 
     # Generate title for new conversations
@@ -156,32 +179,216 @@ async def chat_endpoint(
                 content = first_user_msg.content.strip()
                 title = content[:30] + ("..." if len(content) > 30 else "")
                 logger.debug(
-                    f"Generated title for conversation {conversation_id}: {title}"
+                    f"Generated title for conversation {conv.id}: {title}"
                 )
         except Exception as e:
             logger.error(f"Error generating title: {e}")
-            title = f"Conversation {conversation_id[:8]}"  # Fallback title
+            title = f"Conversation {conv.id[:8]}"  # Fallback title
 
-    update_conversation(user_id, conversation_id, history, conv.state, title)
+    # Only persist the messages of this turn; the title is written once
+    await append_messages(
+        turn.user.username,
+        conv.id,
+        turn.new_messages,
+        title=title if title != conv.title else None,
+    )
+    conv.title = title
+    return assistant_msg
 
-    # Trigger async summarization
-    messages_for_summary = [
+
+async def build_model_context(turn: ChatTurn) -> Tuple[List[BaseMessage], Dict[str, Any], int]:
+    """Select the history window for a turn.
+
+    Returns the model messages, the extra ChatGraph arguments and the estimated
+    prompt size in tokens. The system prompt carries the user's latest daily
+    answers; when older turns are cut off, the user's recent summary stands in
+    for them.
+    """
+    profile = chat_profile(turn.user)
+    daily_answers = chat_daily_answers(await get_latest_daily_answers(turn.user.username))
+    summary = turn.user.recent_summary
+    reserved = estimate_text_tokens(ChatGraph.system_prompt(daily_answers, profile, summary))
+    window = select_history(turn.conversation.messages, reserved_tokens=reserved)
+    if not window.omitted:
+        summary = None
+    system_tokens = estimate_text_tokens(ChatGraph.system_prompt(daily_answers, profile, summary))
+    tokens = window.tokens - reserved + system_tokens
+
+    logger.info(
+        f"Chat context for user {turn.user.username}: ~{tokens} tokens, "
+        f"{len(window.messages)} messages sent, {window.omitted} older messages omitted"
+    )
+    messages = await to_langchain_messages(window.messages)
+    graph_args = {
+        "daily_answers": daily_answers,
+        "registration_answers": profile,
+        "conversation_summary": summary,
+        "username": turn.user.username,
+    }
+    return messages, graph_args, tokens
+
+
+def summary_messages(history: List[Message]) -> List[BaseMessage]:
+    return [
         HumanMessage(content=msg.content)
         if msg.role == "user"
         else AIMessage(content=msg.content)
         for msg in history
     ]
-    background_tasks.add_task(summarization_graph.chat, messages_for_summary, user)
 
-    # Convert messages to JSON-serializable format
-    history_serializable = [
-        {
-            "role": msg.role,
-            "content": msg.content,
-            "timestamp": msg.timestamp.isoformat(),
-            "image": msg.image,
+
+def serialize_message(msg: Message) -> Dict[str, Any]:
+    return {
+        "id": msg.id,
+        "role": msg.role,
+        "content": msg.content,
+        "timestamp": msg.timestamp.isoformat(),
+        "image": msg.image,
+    }
+
+
+@app.get("/stats/user-cache", dependencies=[Depends(get_current_user)])
+async def user_cache_stats():
+    """Hit and miss counters of the authenticated user cache."""
+    return user_cache.stats()
+
+
+@app.get("/stats/rag", dependencies=[Depends(get_current_user)])
+async def rag_stats():
+    """Index size, query latency and ingestion throughput of the RAG corpus."""
+    return {
+        "index": vector_index.stats(),
+        "retrieval": retriever.stats(),
+        "ingestion": ingestion_worker.stats(),
+    }
+
+
+@app.get("/stats/jobs", dependencies=[Depends(get_current_user)])
+async def job_stats():
+    """Status, next run and last duration of the scheduled precomputation jobs."""
+    return get_job_status()
+
+
+@app.post("/chat")
+async def chat_endpoint(
+    background_tasks: BackgroundTasks,
+    request: Request,
+    message: str = Form(...),
+    conversation_id: Optional[str] = Form(None),
+    image: Optional[UploadFile] = Form(None),
+    response_mode: Literal["full", "delta"] = Form("full"),
+):
+    """Run one chat turn.
+
+    With `response_mode=delta` only the new assistant message and the sequence
+    number (id of the last stored message) are returned; clients can catch up
+    with GET /conversations/{id}?since=<sequence>.
+    """
+    turn, error = await start_turn(
+        request.cookies.get("user"), message, conversation_id, image
+    )
+    if turn is None:
+        return {"error": error}
+
+    messages, graph_args, context_tokens = await build_model_context(turn)
+
+    try:
+        logger.debug(f"Passing context for user {turn.user.username}")
+        response = await graph.achat(messages, **graph_args)
+    except Exception as e:
+        logger.error(f"Error processing message: {e}")
+        return {"error": "Internal server error"}
+
+    response_text = (
+        response.get("response", response) if isinstance(response, dict) else response
+    )
+
+    assistant_msg = await finish_turn(turn, response_text)
+
+    # Trigger async summarization
+    background_tasks.add_task(
+        summarization_graph.achat, summary_messages(turn.conversation.messages), turn.user
+    )
+
+    if response_mode == "delta":
+        return {
+            "messages": [serialize_message(assistant_msg)] if assistant_msg else [],
+            "conversation_id": turn.conversation.id,
+            "sequence": turn.new_messages[-1].id,
+            "context_tokens": context_tokens,
         }
-        for msg in history
-    ]
 
-    return {"history": history_serializable, "conversation_id": conversation_id}
+    # Convert messages to JSON-serializable format
+    history_serializable = [serialize_message(msg) for msg in turn.conversation.messages]
+
+    return {
+        "history": history_serializable,
+        "conversation_id": turn.conversation.id,
+        "context_tokens": context_tokens,
+    }
+
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(
+    request: Request,
+    message: str = Form(...),
+    conversation_id: Optional[str] = Form(None),
+    image: Optional[UploadFile] = Form(None),
+):
+    """Stream a chat turn as server-sent events.
+
+    Emits `start`, then `token` and `tool_start`/`tool_end` events while the
+    agent runs, and finally `done` carrying only the new assistant message.
+    """
+    turn, error = await start_turn(
+        request.cookies.get("user"), message, conversation_id, image
+    )
+    if turn is None:
+        return {"error": error}
+
+    messages, graph_args, context_tokens = await build_model_context(turn)
+    finished = False
+
+    def sse(event: Dict[str, Any]) -> str:
+        return f"data: {json.dumps(event)}\n\n"
+
+    async def event_stream():
+        nonlocal finished
+        yield sse({"type": "start", "conversation_id": turn.conversation.id})
+        response_text = None
+        try:
+            async for event in graph.astream(messages, **graph_args):
+                if event["type"] == "done":
+                    response_text = event["content"]
+                else:
+                    yield sse(event)
+        except Exception as e:
+            logger.error(f"Error streaming message: {e}")
+            yield sse({"type": "error", "error": "Internal server error"})
+            return
+
+        assistant_msg = await finish_turn(turn, response_text)
+        finished = True
+        yield sse(
+            {
+                "type": "done",
+                "conversation_id": turn.conversation.id,
+                "message": serialize_message(assistant_msg) if assistant_msg else None,
+                "sequence": turn.new_messages[-1].id,
+                "context_tokens": context_tokens,
+            }
+        )
+
+    async def summarize():
+        # Runs after the stream has finished and the turn is persisted
+        if finished:
+            await summarization_graph.achat(
+                summary_messages(turn.conversation.messages), turn.user
+            )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(summarize),
+    )
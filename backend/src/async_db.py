@@ -0,0 +1,67 @@
+"""Async counterparts of the query functions in db.py.
+
+Every call runs on a dedicated thread pool so that async route handlers never
+block the event loop on SQLite. Each worker thread borrows its own connection
+from db.pool, so the functions keep the exact semantics of their sync versions.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, ParamSpec, TypeVar
+from . import db
+from .config import CONFIG
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+executor = ThreadPoolExecutor(
+    max_workers=CONFIG["DB_WORKERS"], thread_name_prefix="db"
+)
+
+
+async def run_in_db_executor(func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+def _to_async(func: Callable[P, R]) -> Callable[P, Awaitable[R]]:
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        return await run_in_db_executor(func, *args, **kwargs)
+
+    return wrapper
+
+
+update_user = _to_async(db.update_user)
+create_user = _to_async(db.create_user)
+get_user = _to_async(db.get_user)
+add_event = _to_async(db.add_event)
+add_events_bulk = _to_async(db.add_events_bulk)
+replace_events_between = _to_async(db.replace_events_between)
+remove_event = _to_async(db.remove_event)
+edit_event = _to_async(db.edit_event)
+get_user_events = _to_async(db.get_user_events)
+get_user_events_between_timestamps = _to_async(db.get_user_events_between_timestamps)
+create_conversation = _to_async(db.create_conversation)
+get_conversation = _to_async(db.get_conversation)
+append_messages = _to_async(db.append_messages)
+get_recent_messages = _to_async(db.get_recent_messages)
+get_user_conversation_summaries = _to_async(db.get_user_conversation_summaries)
+save_daily_answers = _to_async(db.save_daily_answers)
+get_daily_answers = _to_async(db.get_daily_answers)
+has_daily_answers_for = _to_async(db.has_daily_answers_for)
+get_latest_daily_answers = _to_async(db.get_latest_daily_answers)
+get_user_aggregates = _to_async(db.get_user_aggregates)
+get_answer_series = _to_async(db.get_answer_series)
+save_daily_questions = _to_async(db.save_daily_questions)
+get_daily_questions = _to_async(db.get_daily_questions)
+save_daily_dashboard_widgets = _to_async(db.save_daily_dashboard_widgets)
+get_daily_dashboard_widgets = _to_async(db.get_daily_dashboard_widgets)
+update_recent_summary = _to_async(db.update_recent_summary)
+get_recent_summary = _to_async(db.get_recent_summary)
+get_all_users = _to_async(db.get_all_users)
+get_batch_checkpoints = _to_async(db.get_batch_checkpoints)
+save_batch_checkpoint = _to_async(db.save_batch_checkpoint)
+acquire_job_lock = _to_async(db.acquire_job_lock)
+release_job_lock = _to_async(db.release_job_lock)
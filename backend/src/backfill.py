@@ -0,0 +1,31 @@
+"""Rebuild the per-user aggregates from the stored daily answers.
+
+Run after upgrading an existing database, or whenever the aggregates are
+suspected to have drifted from the history:
+
+    uv run backfill            # every user
+    uv run backfill alice bob  # only these users
+"""
+
+import argparse
+from .config import logger
+from .db import get_all_users, rebuild_user_aggregates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("usernames", nargs="*", help="users to rebuild, all users if omitted")
+    args = parser.parse_args()
+
+    usernames = args.usernames or get_all_users()
+    for username in usernames:
+        aggregates = rebuild_user_aggregates(username)
+        logger.info(
+            f"Rebuilt aggregates of {username}: {aggregates.answer_days} days answered, "
+            f"streak {aggregates.current_streak}, longest {aggregates.longest_streak}"
+        )
+    logger.info(f"Rebuilt aggregates of {len(usernames)} users")
+
+
+if __name__ == "__main__":
+    main()
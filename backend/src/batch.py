@@ -0,0 +1,189 @@
+"""Nightly precomputation of daily questions and dashboards for all users.
+
+Users are processed concurrently, bounded by BATCH_CONCURRENCY, and LLM calls
+are spaced by a shared rate limit. A failing user is retried with exponential
+backoff and then skipped without affecting the others. Every finished user is
+checkpointed in the database, so rerunning a job on the same day only handles
+the users that are still missing. With `spread`, user starts are staggered
+evenly over that many seconds instead of all being queued at once.
+"""
+
+import asyncio
+import random
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from pydantic import BaseModel
+from . import async_db
+from .async_db import run_in_db_executor
+from .config import CONFIG, logger
+
+BASE_DAILY_QUESTIONS: List[Dict[str, Any]] = [
+    {
+        "question": "How are you?",
+        "type": "enum",
+        "options": [
+            {"value": "verygood", "label": "Very good"},
+            {"value": "good", "label": "Good"},
+            {"value": "okay", "label": "Okay"},
+            {"value": "notgood", "label": "Not good"},
+            {"value": "bad", "label": "Bad"},
+        ],
+        "optional": False,
+        "field": "mood",
+    },
+    {
+        "question": "What is your blood pressure?",
+        "type": "text",
+        "options": None,
+        "optional": False,
+        "field": "blood_pressure",
+    },
+    {
+        "question": "What is your weight?",
+        "type": "number",
+        "options": None,
+        "optional": False,
+        "field": "weight",
+    },
+    {
+        "question": "Did you take any medication today?",
+        "type": "enum",
+        "options": [
+            {"value": "yes", "label": "Yes"},
+            {"value": "no", "label": "No"},
+        ],
+        "optional": False,
+        "field": "medication",
+    },
+]
+
+
+class RateLimiter:
+    """Lets at most `rate` callers per second through, evenly spaced."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class BatchProgress(BaseModel):
+    job: str
+    date: str
+    total: int = 0
+    done: int = 0
+    skipped: int = 0
+    failed: int = 0
+    retries: int = 0
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+
+    @property
+    def remaining(self) -> int:
+        return self.total - self.done - self.skipped - self.failed
+
+
+async def run_batch(
+    job: str,
+    handler: Callable[[str], Awaitable[None]],
+    usernames: Optional[List[str]] = None,
+    concurrency: int = CONFIG["BATCH_CONCURRENCY"],
+    rate_limiter: Optional[RateLimiter] = None,
+    retries: int = CONFIG["BATCH_RETRIES"],
+    backoff: float = CONFIG["BATCH_BACKOFF"],
+    spread: float = 0.0,
+) -> BatchProgress:
+    """Run `handler` for every user not yet checkpointed for `job` today."""
+    today = datetime.now().date().isoformat()
+    usernames = usernames if usernames is not None else await async_db.get_all_users()
+    completed = await async_db.get_batch_checkpoints(job, today)
+    progress = BatchProgress(job=job, date=today, total=len(usernames), started_at=datetime.now())
+    progress.skipped = sum(1 for username in usernames if username in completed)
+    rate_limiter = rate_limiter or RateLimiter(CONFIG["BATCH_RATE_LIMIT"])
+    semaphore = asyncio.Semaphore(concurrency)
+    log_every = max(1, len(usernames) // 20)
+
+    pending = [username for username in usernames if username not in completed]
+
+    async def process(position: int, username: str):
+        if spread:
+            await asyncio.sleep(position * spread / len(pending))
+        async with semaphore:
+            for attempt in range(retries + 1):
+                await rate_limiter.acquire()
+                try:
+                    await handler(username)
+                    break
+                except Exception as e:
+                    if attempt == retries:
+                        progress.failed += 1
+                        logger.error(f"{job} failed for user {username} after {attempt + 1} attempts: {e}")
+                        return
+                    progress.retries += 1
+                    delay = backoff * 2**attempt * (0.5 + random.random())
+                    logger.warning(f"{job} failed for user {username}, retrying in {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
+
+        await async_db.save_batch_checkpoint(job, today, username)
+        progress.done += 1
+        finished = progress.done + progress.failed
+        if finished % log_every == 0:
+            elapsed = (datetime.now() - progress.started_at).total_seconds()
+            logger.info(
+                f"{job}: {finished}/{progress.total - progress.skipped} users processed, "
+                f"{progress.failed} failed, {finished / elapsed:.2f} users/s"
+            )
+
+    await asyncio.gather(*(process(position, username) for position, username in enumerate(pending)))
+
+    progress.finished_at = datetime.now()
+    logger.info(
+        f"{job} finished in {(progress.finished_at - progress.started_at).total_seconds():.1f}s: "
+        f"{progress.done} done, {progress.skipped} already done, {progress.failed} failed, {progress.retries} retries"
+    )
+    return progress
+
+
+async def generate_daily_questions(username: str):
+    from .state import questions_graph
+    from .utils import get_recent_messages
+
+    user = await async_db.get_user(username)
+    if user is None:
+        return
+
+    recent_messages = await run_in_db_executor(get_recent_messages, username)
+    additional_questions = await questions_graph.achat(
+        recent_messages, BASE_DAILY_QUESTIONS, user, raise_errors=True
+    )
+    await async_db.save_daily_questions(username, BASE_DAILY_QUESTIONS + additional_questions[:2])
+
+
+async def generate_daily_dashboard(username: str):
+    from .state import dashboard_graph
+
+    user = await async_db.get_user(username, with_events=True)
+    if user is None:
+        return
+
+    widgets = await dashboard_graph.arun(user.__dict__, raise_errors=True)
+    await async_db.save_daily_dashboard_widgets(username, [widget.__dict__ for widget in widgets])
+
+
+async def run_daily_questions(usernames: Optional[List[str]] = None, spread: float = 0.0) -> BatchProgress:
+    return await run_batch("daily_questions", generate_daily_questions, usernames, spread=spread)
+
+
+async def run_daily_dashboards(usernames: Optional[List[str]] = None, spread: float = 0.0) -> BatchProgress:
+    return await run_batch("daily_dashboard", generate_daily_dashboard, usernames, spread=spread)
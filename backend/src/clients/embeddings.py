@@ -1,18 +1,255 @@
+import hashlib
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import numpy as np
 from langchain_aws import BedrockEmbeddings
+from langchain_core.embeddings import Embeddings as BaseEmbeddings
 from dotenv import load_dotenv
 from ..config import CONFIG, logger
+from ..db import ConnectionPool
 
 load_dotenv()
 
+BEDROCK_MODEL_ID = "amazon.titan-embed-text-v2:0"
+
+
+class HashingEmbeddings(BaseEmbeddings):
+    """Deterministic local embeddings for offline development and tests.
+
+    Words and word pairs are hashed into `size` signed buckets, so texts that
+    share terms end up close to each other. No network access is needed.
+    """
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        words = re.findall(r"\w+", text.lower())
+        for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.size] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class EmbeddingCache:
+    """Embeddings keyed by model and text hash, stored in SQLite.
+
+    Triggers keep the total size of the stored vectors in `embedding_bytes`,
+    so a write checks the limit without scanning the table. When it exceeds
+    `max_bytes`, the least recently used vectors are evicted down to
+    `EVICT_TO` of the limit, so evictions stay rare. Reads only refresh
+    `last_used` of rows not used for `touch_seconds`, so a warm cache is read
+    without writing.
+    """
+
+    EVICT_TO = 0.9
+
+    def __init__(self, path: str, max_bytes: int, touch_seconds: float = 3600.0):
+        self.pool = ConnectionPool(path)
+        self.max_bytes = max_bytes
+        self.touch_seconds = touch_seconds
+        conn = self.pool.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            """
+        CREATE TABLE IF NOT EXISTS embeddings (
+            key TEXT PRIMARY KEY,
+            vector BLOB NOT NULL,
+            last_used REAL NOT NULL
+        )
+        """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        conn.execute("CREATE TABLE IF NOT EXISTS embedding_bytes (id INTEGER PRIMARY KEY CHECK (id = 1), bytes INTEGER NOT NULL)")
+        conn.execute(
+            """
+        CREATE TRIGGER IF NOT EXISTS embeddings_insert_bytes AFTER INSERT ON embeddings BEGIN
+            UPDATE embedding_bytes SET bytes = bytes + LENGTH(NEW.vector) WHERE id = 1;
+        END
+        """
+        )
+        conn.execute(
+            """
+        CREATE TRIGGER IF NOT EXISTS embeddings_update_bytes AFTER UPDATE OF vector ON embeddings BEGIN
+            UPDATE embedding_bytes SET bytes = bytes + LENGTH(NEW.vector) - LENGTH(OLD.vector) WHERE id = 1;
+        END
+        """
+        )
+        conn.execute(
+            """
+        CREATE TRIGGER IF NOT EXISTS embeddings_delete_bytes AFTER DELETE ON embeddings BEGIN
+            UPDATE embedding_bytes SET bytes = bytes - LENGTH(OLD.vector) WHERE id = 1;
+        END
+        """
+        )
+        if conn.execute("SELECT 1 FROM embedding_bytes WHERE id = 1").fetchone() is None:
+            # Caches created before the running total existed are summed once
+            conn.execute(
+                "INSERT INTO embedding_bytes (id, bytes) SELECT 1, COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            )
+        conn.commit()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def size(self) -> int:
+        conn = self.pool.connection()
+        return conn.execute("SELECT bytes FROM embedding_bytes WHERE id = 1").fetchone()[0]
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        if not keys:
+            return {}
+        conn = self.pool.connection()
+        now = time.time()
+        found: Dict[str, List[float]] = {}
+        touched: List[str] = []
+        # Stay below SQLite's limit on bound parameters
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT key, vector, last_used FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, vector, last_used in rows:
+                found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+                if now - last_used >= self.touch_seconds:
+                    touched.append(key)
+
+        if touched:
+            for start in range(0, len(touched), 500):
+                batch = touched[start:start + 500]
+                conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(batch))})",
+                    [now, *batch],
+                )
+            conn.commit()
+        return found
+
+    def put_many(self, entries: Dict[str, List[float]]):
+        if not entries:
+            return
+        conn = self.pool.connection()
+        now = time.time()
+        conn.executemany(
+            """
+        INSERT INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)
+        ON CONFLICT(key) DO UPDATE SET vector = excluded.vector, last_used = excluded.last_used
+        """,
+            [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in entries.items()],
+        )
+        conn.commit()
+        if self.size() > self.max_bytes:
+            self._evict(conn)
+
+    def _evict(self, conn):
+        excess = self.size() - int(self.max_bytes * self.EVICT_TO)
+        if excess <= 0:
+            return
+        # Delete the least recently used rows until the excess is covered
+        conn.execute(
+            """
+        DELETE FROM embeddings WHERE key IN (
+            SELECT key FROM (
+                SELECT key, SUM(LENGTH(vector)) OVER (ORDER BY last_used, key) - LENGTH(vector) AS freed_before
+                FROM embeddings
+            ) WHERE freed_before < ?
+        )
+        """,
+            (excess,),
+        )
+        conn.commit()
+        logger.info(f"Evicted embeddings from the cache, {self.size()} bytes left")
+
+
+class CachedEmbeddings(BaseEmbeddings):
+    """Embeddings served from an EmbeddingCache, with misses sent to `model` in parallel batches."""
+
+    def __init__(
+        self,
+        model: BaseEmbeddings,
+        model_id: str,
+        cache: Optional[EmbeddingCache],
+        batch_size: int,
+        concurrency: int,
+    ):
+        self.model = model
+        self.model_id = model_id
+        self.cache = cache
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed")
+
+    def _embed_missing(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self.model.embed_documents(batches[0])
+        results = self.executor.map(self.model.embed_documents, batches)
+        return [vector for batch in results for vector in batch]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.cache is None:
+            return self._embed_missing(texts)
+
+        keys = [EmbeddingCache.key(self.model_id, text) for text in texts]
+        found = self.cache.get_many(list(set(keys)))
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            vectors = self._embed_missing(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+        logger.debug(f"Embedded {len(texts)} texts, {len(missing)} cache misses")
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.cache is None:
+            return self.model.embed_query(text)
+
+        key = EmbeddingCache.key(f"{self.model_id}:query", text)
+        found = self.cache.get_many([key])
+        if key in found:
+            return found[key]
+        vector = self.model.embed_query(text)
+        self.cache.put_many({key: vector})
+        return vector
+
 
 class Embeddings:
     def __init__(self):
         try:
-            self.embeddings = BedrockEmbeddings(
-                model_id="amazon.titan-embed-text-v2:0",
-                region_name=CONFIG["AWS_DEFAULT_REGION"],
+            if CONFIG["EMBEDDING_MODEL"] == "local":
+                model = HashingEmbeddings()
+                model_id = "local-hashing-1024"
+                logger.info("Using local hashing embeddings")
+            else:
+                model = BedrockEmbeddings(
+                    model_id=BEDROCK_MODEL_ID,
+                    region_name=CONFIG["AWS_DEFAULT_REGION"],
+                )
+                model_id = BEDROCK_MODEL_ID
+                logger.info("Using Bedrock embeddings")
+
+            cache = None
+            if CONFIG["EMBEDDING_CACHE_BYTES"] > 0:
+                cache = EmbeddingCache(CONFIG["EMBEDDING_CACHE_PATH"], CONFIG["EMBEDDING_CACHE_BYTES"])
+            self.embeddings = CachedEmbeddings(
+                model,
+                model_id,
+                cache,
+                batch_size=CONFIG["EMBEDDING_BATCH_SIZE"],
+                concurrency=CONFIG["EMBEDDING_CONCURRENCY"],
             )
-            logger.info("Using Bedrock embeddings")
         except Exception as e:
             logger.error(f"Failed to initialize embeddings: {e}")
             raise
@@ -1,4 +1,5 @@
 import boto3
+from botocore.config import Config
 from langchain_aws import ChatBedrockConverse
 from dotenv import load_dotenv
 from ..config import CONFIG, logger
@@ -10,7 +11,10 @@ class LLM:
     def __init__(self):
         try:
             self.bedrock_client = boto3.client(
-                "bedrock-runtime", region_name=CONFIG["AWS_DEFAULT_REGION"]
+                "bedrock-runtime",
+                region_name=CONFIG["AWS_DEFAULT_REGION"],
+                # Sized for concurrent requests and tool calls sharing this client
+                config=Config(max_pool_connections=CONFIG["LLM_MAX_CONNECTIONS"]),
             )
             self.llm = ChatBedrockConverse(
                 model="us.anthropic.claude-sonnet-4-5-20250929-v1:0",
@@ -4,6 +4,42 @@ from loguru import logger
 CONFIG = {
     "MODEL": os.getenv("MODEL", "grok"),
     "AWS_DEFAULT_REGION": os.getenv("AWS_DEFAULT_REGION", "us-west-2"),
+    "DB_PATH": os.getenv("DB_PATH", "healthcare.db"),
+    "DB_WORKERS": int(os.getenv("DB_WORKERS", "8")),
+    "TOOL_CONCURRENCY": int(os.getenv("TOOL_CONCURRENCY", "8")),
+    "TOOL_TURN_TIMEOUT": float(os.getenv("TOOL_TURN_TIMEOUT", "60")),
+    # Extra threads for tool calls that are still running after TOOL_TURN_TIMEOUT
+    "TOOL_OVERRUN_THREADS": int(os.getenv("TOOL_OVERRUN_THREADS", "8")),
+    "MAX_TOOL_ITERATIONS": int(os.getenv("MAX_TOOL_ITERATIONS", "25")),
+    "IMAGE_MAX_SIDE": int(os.getenv("IMAGE_MAX_SIDE", "1568")),
+    "IMAGE_CACHE_BYTES": int(os.getenv("IMAGE_CACHE_BYTES", str(64 * 1024 * 1024))),
+    "CHAT_IMAGE_TURNS": int(os.getenv("CHAT_IMAGE_TURNS", "3")),
+    "CHAT_HISTORY_TURNS": int(os.getenv("CHAT_HISTORY_TURNS", "10")),
+    "CHAT_CONTEXT_TOKENS": int(os.getenv("CHAT_CONTEXT_TOKENS", "16000")),
+    "EMBEDDING_MODEL": os.getenv("EMBEDDING_MODEL", "bedrock"),
+    "EMBEDDING_CACHE_PATH": os.getenv("EMBEDDING_CACHE_PATH", "embeddings_cache.db"),
+    "EMBEDDING_CACHE_BYTES": int(os.getenv("EMBEDDING_CACHE_BYTES", str(256 * 1024 * 1024))),
+    "EMBEDDING_BATCH_SIZE": int(os.getenv("EMBEDDING_BATCH_SIZE", "16")),
+    "EMBEDDING_CONCURRENCY": int(os.getenv("EMBEDDING_CONCURRENCY", "4")),
+    "RAG_INDEX_DIR": os.getenv("RAG_INDEX_DIR", "rag_index"),
+    "RAG_APPROXIMATE_SEARCH": os.getenv("RAG_APPROXIMATE_SEARCH", "false").lower() == "true",
+    "RAG_SEARCH_LISTS": int(os.getenv("RAG_SEARCH_LISTS", "0")),
+    "RAG_SEARCH_PROBES": int(os.getenv("RAG_SEARCH_PROBES", "8")),
+    "RAG_QUERY_CACHE_SIZE": int(os.getenv("RAG_QUERY_CACHE_SIZE", "512")),
+    "BATCH_CONCURRENCY": int(os.getenv("BATCH_CONCURRENCY", "8")),
+    "BATCH_RATE_LIMIT": float(os.getenv("BATCH_RATE_LIMIT", "4")),
+    "BATCH_RETRIES": int(os.getenv("BATCH_RETRIES", "3")),
+    "BATCH_BACKOFF": float(os.getenv("BATCH_BACKOFF", "2")),
+    "SCHEDULER_ENABLED": os.getenv("SCHEDULER_ENABLED", "true").lower() == "true",
+    "SCHEDULER_DAILY_QUESTIONS_AT": os.getenv("SCHEDULER_DAILY_QUESTIONS_AT", "02:00"),
+    "SCHEDULER_DAILY_DASHBOARD_AT": os.getenv("SCHEDULER_DAILY_DASHBOARD_AT", "04:00"),
+    "SCHEDULER_WINDOW_MINUTES": int(os.getenv("SCHEDULER_WINDOW_MINUTES", "90")),
+    "RECENT_MESSAGES_HOURS": float(os.getenv("RECENT_MESSAGES_HOURS", "24")),
+    "RECENT_MESSAGES_LIMIT": int(os.getenv("RECENT_MESSAGES_LIMIT", "200")),
+    "DASHBOARD_GRAPH_DAYS": int(os.getenv("DASHBOARD_GRAPH_DAYS", "30")),
+    "LLM_MAX_CONNECTIONS": int(os.getenv("LLM_MAX_CONNECTIONS", "50")),
+    "USER_CACHE_SIZE": int(os.getenv("USER_CACHE_SIZE", "1024")),
+    "USER_CACHE_TTL": float(os.getenv("USER_CACHE_TTL", "30")),
 }
 
 logger.add(
@@ -0,0 +1,110 @@
+"""Selection of the conversation history that is sent to the model.
+
+The model only sees the last CHAT_HISTORY_TURNS turns of a conversation, and
+fewer if they do not fit into CHAT_CONTEXT_TOKENS. Older turns are represented
+by the user's persisted recent summary instead. Token counts are estimates
+(about four characters per token), which is enough for budgeting.
+"""
+
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+from .config import CONFIG
+from .db import DailyAnswers, Message, User
+
+MESSAGE_OVERHEAD_TOKENS = 4
+IMAGE_TOKENS = 1600
+
+PROFILE_FIELDS = {
+    # The calendar and diet tools take the username as an argument
+    "username",
+    "first_name",
+    "last_name",
+    "age",
+    "height",
+    "gender",
+    "allergies",
+    "issues",
+    "goal",
+    "epa_summary",
+}
+
+
+class ContextWindow(BaseModel):
+    messages: List[Message]
+    omitted: int = 0
+    tokens: int = 0
+
+
+def estimate_text_tokens(text: Optional[str]) -> int:
+    return (len(text) + 3) // 4 if text else 0
+
+
+def estimate_message_tokens(message: Message, with_image: bool = False) -> int:
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimate_text_tokens(message.content)
+    if with_image and message.image:
+        tokens += IMAGE_TOKENS
+    return tokens
+
+
+def split_turns(history: List[Message]) -> List[List[Message]]:
+    """Group messages into turns, each starting with a user message."""
+    turns: List[List[Message]] = []
+    for message in history:
+        if message.role == "user" or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def select_history(
+    history: List[Message],
+    reserved_tokens: int = 0,
+    max_turns: Optional[int] = None,
+    token_budget: Optional[int] = None,
+) -> ContextWindow:
+    """Keep the most recent turns that fit into the token budget.
+
+    `reserved_tokens` accounts for the system prompt. The latest turn is always
+    kept, even if it alone exceeds the budget.
+    """
+    max_turns = max_turns if max_turns is not None else CONFIG["CHAT_HISTORY_TURNS"]
+    token_budget = token_budget if token_budget is not None else CONFIG["CHAT_CONTEXT_TOKENS"]
+
+    turns = split_turns(history)
+    kept = turns[-max_turns:] if max_turns > 0 else turns[-1:]
+    image_turns = CONFIG["CHAT_IMAGE_TURNS"]
+    turn_tokens = [
+        sum(
+            estimate_message_tokens(message, with_image=i >= len(kept) - image_turns)
+            for message in turn
+        )
+        for i, turn in enumerate(kept)
+    ]
+
+    available = token_budget - reserved_tokens
+    while len(kept) > 1 and sum(turn_tokens) > available:
+        kept = kept[1:]
+        turn_tokens = turn_tokens[1:]
+
+    messages = [message for turn in kept for message in turn]
+    return ContextWindow(
+        messages=messages,
+        omitted=len(history) - len(messages),
+        tokens=reserved_tokens + sum(turn_tokens),
+    )
+
+
+def chat_profile(user: User) -> Dict[str, Any]:
+    """The parts of a user's profile that are useful in the chat system prompt."""
+    return user.model_dump(include=PROFILE_FIELDS, exclude_none=True)
+
+
+def chat_daily_answers(latest: Optional[DailyAnswers]) -> List[Dict[str, Any]]:
+    """The user's most recent daily answers, without the question texts."""
+    if latest is None:
+        return []
+    return [
+        {"date": latest.date[:10], "field": answer.field or answer.question, "answer": answer.answer}
+        for answer in latest.answers
+    ]
@@ -1,9 +1,14 @@
-from typing import Literal, Optional, List, Dict, Any
+from typing import Literal, NamedTuple, Optional, List, Dict, Any, Tuple
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import uuid
 import sqlite3
+import threading
+import time
 import json
+import re
+from .config import CONFIG, logger
+from .user_cache import user_cache
 
 
 class Event(BaseModel):
@@ -14,12 +19,33 @@ class Event(BaseModel):
 
 
 class Message(BaseModel):
+    id: Optional[int] = None
     role: str
     content: str
     timestamp: datetime
     image: Optional[str] = None
 
 
+class RecentMessage(NamedTuple):
+    """A message row as returned by get_recent_messages; cheaper to build than a Message."""
+
+    conversation_id: str
+    id: int
+    role: str
+    content: str
+    timestamp: str
+    image: Optional[str]
+
+    def to_message(self) -> Message:
+        return Message(
+            id=self.id,
+            role=self.role,
+            content=self.content,
+            timestamp=datetime.fromisoformat(self.timestamp),
+            image=self.image,
+        )
+
+
 class Conversation(BaseModel):
     id: str
     messages: List[Message] = []
@@ -27,6 +53,13 @@ class Conversation(BaseModel):
     title: Optional[str] = None
 
 
+class ConversationSummary(BaseModel):
+    id: str
+    title: Optional[str]
+    date: datetime
+    message_count: int = 0
+
+
 class Answer(BaseModel):
     question: str
     answer: str
@@ -38,128 +71,415 @@ class DailyAnswers(BaseModel):
     answers: List[Answer]
 
 
-# Database setup
-conn = sqlite3.connect("healthcare.db", check_same_thread=False)
-conn.execute("PRAGMA foreign_keys = ON")
+class SeriesPoint(BaseModel):
+    date: str
+    average: float
+    minimum: float
+    maximum: float
+    count: int
+
+
+# Numeric values of enum answers, so they can be averaged like measurements
+ANSWER_SCORES: Dict[str, Dict[str, float]] = {
+    "mood": {"verygood": 5, "good": 4, "okay": 3, "notgood": 2, "bad": 1},
+    "medication": {"yes": 1, "no": 0},
+}
+
+NUMBER_PATTERN = re.compile(r"-?\d+(?:[.,]\d+)?")
+
+# Fields with running statistics in user_aggregates
+AGGREGATE_FIELDS = ("mood", "weight")
+
+SERIES_BUCKETS = {
+    "day": "date",
+    "week": "date(date, 'weekday 0', '-6 days')",
+    "month": "date(date, 'start of month')",
+}
+
+
+class FieldStats(BaseModel):
+    count: int = 0
+    total: float = 0.0
+    minimum: Optional[float] = None
+    maximum: Optional[float] = None
+    last: Optional[float] = None
+
+    @property
+    def average(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        self.last = value
+
+
+class UserAggregates(BaseModel):
+    username: str
+    last_answer_date: Optional[str] = None
+    current_streak: int = 0
+    longest_streak: int = 0
+    answer_days: int = 0
+    mood: FieldStats = FieldStats()
+    weight: FieldStats = FieldStats()
+
+    def streak(self, today: date) -> int:
+        """The current streak, or 0 once neither today nor yesterday was answered."""
+        if self.last_answer_date is None:
+            return 0
+        if date.fromisoformat(self.last_answer_date) < today - timedelta(days=1):
+            return 0
+        return self.current_streak
+
+
+class ConnectionPool:
+    """Hands out one SQLite connection per thread.
+
+    FastAPI runs sync handlers and background tasks on a threadpool, so sharing
+    a single connection lets cursors from different requests interleave. Each
+    thread gets its own connection configured for concurrent access (WAL,
+    busy timeout) instead. Connections are closed together with their thread.
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms}")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA cache_size = -16000")  # ~16 MB page cache
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        elif conn.in_transaction:
+            # A previous call on this thread failed before committing; do not
+            # keep holding its write lock
+            logger.warning("Rolling back unfinished transaction on pooled connection")
+            conn.rollback()
+        return conn
+
+
+pool = ConnectionPool(CONFIG["DB_PATH"])
+
+
+def get_connection() -> sqlite3.Connection:
+    return pool.connection()
+
+
+def _as_local(timestamp: datetime) -> datetime:
+    """Naive local wall-clock time; aware timestamps are converted to it."""
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone().replace(tzinfo=None)
+
+
+def _to_epoch(timestamp: datetime) -> int:
+    """Seconds since the epoch; naive timestamps are taken as local time."""
+    return int(timestamp.timestamp())
+
+
+def _from_epoch(seconds: int) -> datetime:
+    return datetime.fromtimestamp(seconds)
 
-# Create tables
-cursor = conn.cursor()
-cursor.execute(
+
+def _event_from_row(row) -> Event:
+    return Event(
+        id=row[0],
+        description=row[1],
+        from_timestamp=_from_epoch(row[2]),
+        to_timestamp=_from_epoch(row[3]),
+    )
+
+
+def answer_values(field: str, answer: str) -> List[Tuple[str, Optional[float]]]:
+    """(field, number) pairs stored for one answer.
+
+    Enum answers map to their score, free text to the first number in it. A
+    blood pressure such as 120/80 is stored as systolic under its own field
+    and diastolic under `blood_pressure_diastolic`.
+    """
+    scores = ANSWER_SCORES.get(field)
+    if scores is not None:
+        return [(field, scores.get(answer.strip().lower()))]
+
+    numbers = [float(number.replace(",", ".")) for number in NUMBER_PATTERN.findall(answer)]
+    values = [(field, numbers[0] if numbers else None)]
+    if field == "blood_pressure" and len(numbers) >= 2:
+        values.append(("blood_pressure_diastolic", numbers[1]))
+    return values
+
+
+def _insert_answer_values(cursor: sqlite3.Cursor, username: str, day: str, answers: List[Answer]):
+    cursor.executemany(
+        """
+    INSERT INTO answer_values (username, date, field, value_text, value_num) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(username, field, date) DO UPDATE SET value_text = excluded.value_text, value_num = excluded.value_num
+    """,
+        [
+            (username, day, field, answer.answer, value)
+            for answer in answers
+            if answer.field
+            for field, value in answer_values(answer.field, answer.answer)
+        ],
+    )
+
+
+def init_db():
+    conn = get_connection()
+
+    # Create tables
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password TEXT NOT NULL,
+        first_name TEXT,
+        last_name TEXT,
+        age INTEGER,
+        height INTEGER,
+        gender TEXT,
+        status TEXT NOT NULL,
+        allergies TEXT,
+        issues TEXT,
+        goal TEXT,
+        epa_summary TEXT,
+        recent_summary TEXT
+    )
+    """
+    )
+
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS events (
+        id TEXT PRIMARY KEY,
+        username TEXT NOT NULL,
+        description TEXT NOT NULL,
+        from_timestamp INTEGER NOT NULL,
+        to_timestamp INTEGER NOT NULL,
+        FOREIGN KEY (username) REFERENCES users (username)
+    )
+    """
+    )
+
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS conversations (
+        id TEXT PRIMARY KEY,
+        username TEXT NOT NULL,
+        state TEXT,
+        FOREIGN KEY (username) REFERENCES users (username)
+    )
     """
-CREATE TABLE IF NOT EXISTS users (
-    username TEXT PRIMARY KEY,
-    password TEXT NOT NULL,
-    first_name TEXT,
-    last_name TEXT,
-    age INTEGER,
-    height INTEGER,
-    gender TEXT,
-    status TEXT NOT NULL,
-    allergies TEXT,
-    issues TEXT,
-    goal TEXT,
-    epa_summary TEXT,
-    recent_summary TEXT
-)
-"""
-)
-
-cursor.execute(
+    )
+
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        conversation_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        image TEXT,
+        FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+    )
     """
-CREATE TABLE IF NOT EXISTS events (
-    id TEXT PRIMARY KEY,
-    username TEXT NOT NULL,
-    description TEXT NOT NULL,
-    from_timestamp TEXT NOT NULL,
-    to_timestamp TEXT NOT NULL,
-    FOREIGN KEY (username) REFERENCES users (username)
-)
-"""
-)
-
-cursor.execute(
+    )
+
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS daily_answers (
+        username TEXT,
+        answers TEXT NOT NULL,
+        date TEXT NOT NULL,
+        FOREIGN KEY (username) REFERENCES users (username)
+        PRIMARY KEY (username, date)
+    )
     """
-CREATE TABLE IF NOT EXISTS conversations (
-    id TEXT PRIMARY KEY,
-    username TEXT NOT NULL,
-    state TEXT,
-    FOREIGN KEY (username) REFERENCES users (username)
-)
-"""
-)
-
-cursor.execute(
+    )
+
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS daily_questions (
+        username TEXT NOT NULL,
+        date TEXT NOT NULL,
+        questions TEXT NOT NULL,
+        FOREIGN KEY (username) REFERENCES users (username),
+        PRIMARY KEY (username, date)
+    )
     """
-CREATE TABLE IF NOT EXISTS messages (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    conversation_id TEXT NOT NULL,
-    role TEXT NOT NULL,
-    content TEXT NOT NULL,
-    timestamp TEXT NOT NULL,
-    image TEXT,
-    FOREIGN KEY (conversation_id) REFERENCES conversations (id)
-)
-"""
-)
-
-cursor.execute(
+    )
+
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS daily_dashboard_widgets (
+        username TEXT NOT NULL,
+        date TEXT NOT NULL,
+        widgets TEXT NOT NULL,
+        FOREIGN KEY (username) REFERENCES users (username),
+        PRIMARY KEY (username, date)
+    )
     """
-CREATE TABLE IF NOT EXISTS daily_answers (
-    username TEXT,
-    answers TEXT NOT NULL,
-    date TEXT NOT NULL,
-    FOREIGN KEY (username) REFERENCES users (username)
-    PRIMARY KEY (username, date)
-)
-"""
-)
-
-cursor.execute(
+    )
+
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS job_locks (
+        job TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
     """
-CREATE TABLE IF NOT EXISTS daily_questions (
-    username TEXT NOT NULL,
-    date TEXT NOT NULL,
-    questions TEXT NOT NULL,
-    FOREIGN KEY (username) REFERENCES users (username),
-    PRIMARY KEY (username, date)
-)
-"""
-)
-
-cursor.execute(
+    )
+
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS batch_checkpoints (
+        job TEXT NOT NULL,
+        date TEXT NOT NULL,
+        username TEXT NOT NULL,
+        finished_at TEXT NOT NULL,
+        PRIMARY KEY (job, date, username)
+    )
     """
-CREATE TABLE IF NOT EXISTS daily_dashboard_widgets (
-    username TEXT NOT NULL,
-    date TEXT NOT NULL,
-    widgets TEXT NOT NULL,
-    FOREIGN KEY (username) REFERENCES users (username),
-    PRIMARY KEY (username, date)
-)
-"""
-)
-
-conn.commit()
-
-# Add recent_summary column if not exists
-try:
-    cursor.execute("ALTER TABLE users ADD COLUMN recent_summary TEXT;")
+    )
+
+    conn.commit()
+
+    # Add recent_summary column if not exists
+    try:
+        cursor.execute("ALTER TABLE users ADD COLUMN recent_summary TEXT;")
+        conn.commit()
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+    # Add image column to messages if not exists
+    try:
+        cursor.execute("ALTER TABLE messages ADD COLUMN image TEXT;")
+        conn.commit()
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+    # Add title column to conversations if not exists
+    try:
+        cursor.execute("ALTER TABLE conversations ADD COLUMN title TEXT;")
+        conn.commit()
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+    # Event timestamps used to be ISO text, convert them to epoch seconds
+    cursor.execute("SELECT type FROM pragma_table_info('events') WHERE name = 'from_timestamp'")
+    if cursor.fetchone()[0] == "TEXT":
+        cursor.execute("ALTER TABLE events RENAME TO events_text")
+        cursor.execute(
+            """
+        CREATE TABLE events (
+            id TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            description TEXT NOT NULL,
+            from_timestamp INTEGER NOT NULL,
+            to_timestamp INTEGER NOT NULL,
+            FOREIGN KEY (username) REFERENCES users (username)
+        )
+        """
+        )
+        cursor.execute("SELECT id, username, description, from_timestamp, to_timestamp FROM events_text")
+        rows = cursor.fetchall()
+        cursor.executemany(
+            "INSERT INTO events (id, username, description, from_timestamp, to_timestamp) VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    row[0],
+                    row[1],
+                    row[2],
+                    _to_epoch(datetime.fromisoformat(row[3])),
+                    _to_epoch(datetime.fromisoformat(row[4])),
+                )
+                for row in rows
+            ],
+        )
+        cursor.execute("DROP TABLE events_text")
+        conn.commit()
+        logger.info(f"Migrated {len(rows)} events to epoch timestamps")
+
+    # Range queries scan by start time; the duration index bounds how far
+    # before the range an overlapping event can start.
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_events_username_from ON events (username, from_timestamp)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_events_username_duration ON events (username, to_timestamp - from_timestamp)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_messages_conversation_timestamp ON messages (conversation_id, timestamp)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_conversations_username ON conversations (username)"
+    )
     conn.commit()
-except sqlite3.OperationalError:
-    pass  # Column already exists
 
-# Add image column to messages if not exists
-try:
-    cursor.execute("ALTER TABLE messages ADD COLUMN image TEXT;")
+    # One row per answered field and day, keyed for per-field time series
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS answer_values (
+        username TEXT NOT NULL,
+        date TEXT NOT NULL,
+        field TEXT NOT NULL,
+        value_text TEXT NOT NULL,
+        value_num REAL,
+        FOREIGN KEY (username) REFERENCES users (username),
+        PRIMARY KEY (username, field, date)
+    ) WITHOUT ROWID
+    """
+    )
     conn.commit()
-except sqlite3.OperationalError:
-    pass  # Column already exists
 
-# Add title column to conversations if not exists
-try:
-    cursor.execute("ALTER TABLE conversations ADD COLUMN title TEXT;")
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS user_aggregates (
+        username TEXT PRIMARY KEY,
+        last_answer_date TEXT,
+        current_streak INTEGER NOT NULL,
+        longest_streak INTEGER NOT NULL,
+        answer_days INTEGER NOT NULL,
+        stats TEXT NOT NULL,
+        FOREIGN KEY (username) REFERENCES users (username)
+    )
+    """
+    )
     conn.commit()
-except sqlite3.OperationalError:
-    pass  # Column already exists
+
+    # Split the JSON answers saved before answer_values existed
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM answer_values)")
+    if not cursor.fetchone()[0]:
+        cursor.execute("SELECT username, date, answers FROM daily_answers ORDER BY date")
+        rows = cursor.fetchall()
+        for username, saved_at, answers in rows:
+            _insert_answer_values(
+                cursor,
+                username,
+                saved_at[:10],
+                [Answer.model_validate(item) for item in json.loads(answers)],
+            )
+        conn.commit()
+        if rows:
+            logger.info(f"Migrated {len(rows)} daily answers to answer_values")
+
+
+init_db()
 
 
 class User(BaseModel):
@@ -193,6 +513,7 @@ def update_user(update: UpdateUser):
     # Use existing password if not provided
     password = update.password or user.password
 
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         """
@@ -228,9 +549,11 @@ def update_user(update: UpdateUser):
         ),
     )
     conn.commit()
+    user_cache.invalidate(update.username)
 
 
 def create_user(user: User):
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         """
@@ -254,15 +577,37 @@ def create_user(user: User):
         ),
     )
     conn.commit()
+    user_cache.invalidate(user.username)
 
 
-def get_user(username: str):
+def get_user(username: str, with_events: bool = False):
+    """Look up a user by primary key.
+
+    Events are only loaded when `with_events` is set; everything else can fetch
+    them on demand with get_user_events.
+    """
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
+    cursor.execute(
+        """
+    SELECT u.username, u.password, u.first_name, u.last_name, u.age, u.height, u.gender, u.status,
+        u.allergies, u.issues, u.goal, u.epa_summary, u.recent_summary, a.username, a.last_answer_date
+    FROM users u LEFT JOIN user_aggregates a ON a.username = u.username
+    WHERE u.username = ?
+    """,
+        (username,),
+    )
     row = cursor.fetchone()
     if row is None:
         return None
 
+    today = datetime.now().date()
+    if row[13] is not None:
+        answered_today = row[14] == today.isoformat()
+    else:
+        # Not backfilled into user_aggregates yet
+        answered_today = has_daily_answers_for(username, today)
+
     user = User(
         username=row[0],
         password=row[1],
@@ -277,52 +622,118 @@ def get_user(username: str):
         goal=row[10],
         epa_summary=row[11],
         recent_summary=row[12],
-        events=get_user_events(username) or [],
+        needs_daily_questions=not answered_today,
     )
+    if with_events:
+        user.events = get_user_events(username) or []
+    return user
 
-    today = datetime.now().date().isoformat()
-    daily_answers = get_daily_answers(username)
-    user.needs_daily_questions = not any(
-        entry.date.startswith(today) for entry in daily_answers
+
+def _user_exists(cursor: sqlite3.Cursor, username: str) -> bool:
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM users WHERE username = ?)", (username,))
+    return bool(cursor.fetchone()[0])
+
+
+def _insert_events(
+    cursor: sqlite3.Cursor, username: str, events: List[Tuple[str, datetime, datetime]]
+) -> List[Event]:
+    created = [
+        Event(
+            id=str(uuid.uuid4()),
+            description=description,
+            from_timestamp=_as_local(from_timestamp),
+            to_timestamp=_as_local(to_timestamp),
+        )
+        for description, from_timestamp, to_timestamp in events
+    ]
+    cursor.executemany(
+        """
+    INSERT INTO events (id, username, description, from_timestamp, to_timestamp)
+    VALUES (?, ?, ?, ?, ?)
+    """,
+        [
+            (
+                event.id,
+                username,
+                event.description,
+                _to_epoch(event.from_timestamp),
+                _to_epoch(event.to_timestamp),
+            )
+            for event in created
+        ],
     )
-    return user
+    return created
 
 
 def add_event(
     username: str, description: str, from_timestamp: datetime, to_timestamp: datetime
 ):
-    user = get_user(username)
-    if user is None:
+    events = add_events_bulk(username, [(description, from_timestamp, to_timestamp)])
+    return events[0] if events is not None else None
+
+
+def add_events_bulk(
+    username: str, events: List[Tuple[str, datetime, datetime]]
+) -> Optional[List[Event]]:
+    """Insert (description, from_timestamp, to_timestamp) events in one transaction.
+
+    Returns None if the user does not exist.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    if not _user_exists(cursor, username):
+        return None
+    created = _insert_events(cursor, username, events)
+    conn.commit()
+    user_cache.invalidate(username)
+    return created
+
+
+def replace_events_between(
+    username: str,
+    from_timestamp: datetime,
+    to_timestamp: datetime,
+    events: List[Tuple[str, datetime, datetime]],
+    description_prefix: str = "",
+) -> Optional[Tuple[int, List[Event]]]:
+    """Swap the events starting in the range for `events` in one transaction.
+
+    Only events whose description starts with `description_prefix` are
+    removed. Returns the number removed and the events added, or None if the
+    user does not exist.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    if not _user_exists(cursor, username):
         return None
-    event_id = str(uuid.uuid4())
     cursor.execute(
         """
-    INSERT INTO events (id, username, description, from_timestamp, to_timestamp)
-    VALUES (?, ?, ?, ?, ?)
+    DELETE FROM events
+    WHERE username = ? AND from_timestamp >= ? AND from_timestamp < ? AND substr(description, 1, ?) = ?
     """,
         (
-            event_id,
             username,
-            description,
-            from_timestamp.isoformat(),
-            to_timestamp.isoformat(),
+            _to_epoch(from_timestamp),
+            _to_epoch(to_timestamp),
+            len(description_prefix),
+            description_prefix,
         ),
     )
+    removed = cursor.rowcount
+    created = _insert_events(cursor, username, events)
     conn.commit()
-    return Event(
-        id=event_id,
-        description=description,
-        from_timestamp=from_timestamp,
-        to_timestamp=to_timestamp,
-    )
+    user_cache.invalidate(username)
+    return removed, created
 
 
 def remove_event(username: str, event_id: str):
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         "DELETE FROM events WHERE id = ? AND username = ?", (event_id, username)
     )
     conn.commit()
+    user_cache.invalidate(username)
     return cursor.rowcount > 0
 
 
@@ -333,6 +744,7 @@ def edit_event(
     from_timestamp: datetime,
     to_timestamp: datetime,
 ):
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         """
@@ -341,62 +753,55 @@ def edit_event(
     """,
         (
             description,
-            from_timestamp.isoformat(),
-            to_timestamp.isoformat(),
+            _to_epoch(from_timestamp),
+            _to_epoch(to_timestamp),
             event_id,
             username,
         ),
     )
     conn.commit()
+    user_cache.invalidate(username)
     return cursor.rowcount > 0
 
 
 def get_user_events(username: str):
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
-        "SELECT id, description, from_timestamp, to_timestamp FROM events WHERE username = ?",
+        "SELECT id, description, from_timestamp, to_timestamp FROM events WHERE username = ? ORDER BY from_timestamp",
         (username,),
     )
-    rows = cursor.fetchall()
-    events = []
-    for row in rows:
-        events.append(
-            Event(
-                id=row[0],
-                description=row[1],
-                from_timestamp=datetime.fromisoformat(row[2]),
-                to_timestamp=datetime.fromisoformat(row[3]),
-            )
-        )
-    return events
+    return [_event_from_row(row) for row in cursor.fetchall()]
 
 
 def get_user_events_between_timestamps(
     username: str, from_timestamp: datetime, to_timestamp: datetime
 ):
+    """Events overlapping the range from `from_timestamp` to `to_timestamp`.
+
+    An event overlapping the range cannot start earlier than the range start
+    minus the user's longest event, which turns the overlap test into a
+    bounded scan of the (username, from_timestamp) index.
+    """
+    conn = get_connection()
     cursor = conn.cursor()
+    start = _to_epoch(from_timestamp)
     cursor.execute(
         """
     SELECT id, description, from_timestamp, to_timestamp FROM events
     WHERE username = ? AND from_timestamp < ? AND to_timestamp > ?
+        AND from_timestamp > ? - (
+            SELECT IFNULL(MAX(to_timestamp - from_timestamp), 0) FROM events WHERE username = ?
+        )
+    ORDER BY from_timestamp
     """,
-        (username, to_timestamp.isoformat(), from_timestamp.isoformat()),
+        (username, _to_epoch(to_timestamp), start, start, username),
     )
-    rows = cursor.fetchall()
-    events = []
-    for row in rows:
-        events.append(
-            Event(
-                id=row[0],
-                description=row[1],
-                from_timestamp=datetime.fromisoformat(row[2]),
-                to_timestamp=datetime.fromisoformat(row[3]),
-            )
-        )
-    return events
+    return [_event_from_row(row) for row in cursor.fetchall()]
 
 
 def create_conversation(username: str, conversation_id: str):
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         "INSERT INTO conversations (id, username, state, title) VALUES (?, ?, ?, ?)",
@@ -405,7 +810,11 @@ def create_conversation(username: str, conversation_id: str):
     conn.commit()
 
 
-def get_conversation(username: str, conversation_id: str) -> Optional[Conversation]:
+def get_conversation(
+    username: str, conversation_id: str, since: Optional[int] = None
+) -> Optional[Conversation]:
+    """Load a conversation; with `since`, only messages with a larger id are included."""
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         "SELECT state, title FROM conversations WHERE id = ? AND username = ?",
@@ -418,87 +827,312 @@ def get_conversation(username: str, conversation_id: str) -> Optional[Conversati
     title = row[1]
     # Get messages
     cursor.execute(
-        "SELECT role, content, timestamp, image FROM messages WHERE conversation_id = ? ORDER BY timestamp",
-        (conversation_id,),
+        "SELECT id, role, content, timestamp, image FROM messages WHERE conversation_id = ? AND id > ? ORDER BY timestamp, id",
+        (conversation_id, since if since is not None else 0),
     )
     message_rows = cursor.fetchall()
     messages = []
     for msg_row in message_rows:
         messages.append(
             Message(
-                role=msg_row[0],
-                content=msg_row[1],
-                timestamp=datetime.fromisoformat(msg_row[2]),
-                image=msg_row[3],
+                id=msg_row[0],
+                role=msg_row[1],
+                content=msg_row[2],
+                timestamp=datetime.fromisoformat(msg_row[3]),
+                image=msg_row[4],
             )
         )
     return Conversation(id=conversation_id, messages=messages, state=state, title=title)
 
 
-def update_conversation(
+def append_messages(
     username: str,
     conversation_id: str,
     messages: List[Message],
-    state: Dict[str, Any],
+    state: Optional[Dict[str, Any]] = None,
     title: Optional[str] = None,
 ):
+    """Append new messages to a conversation in a single transaction.
+
+    Existing messages are left untouched. `state` and `title` are only written
+    when given and different from the stored values. The ids assigned to the
+    new rows are set on `messages`, so callers can use them as sequence numbers.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if state is not None:
+            cursor.execute(
+                "UPDATE conversations SET state = ? WHERE id = ? AND username = ? AND state IS NOT ?",
+                (json.dumps(state), conversation_id, username, json.dumps(state)),
+            )
+        if title is not None:
+            cursor.execute(
+                "UPDATE conversations SET title = ? WHERE id = ? AND username = ? AND title IS NOT ?",
+                (title, conversation_id, username, title),
+            )
+        for message in messages:
+            cursor.execute(
+                "INSERT INTO messages (conversation_id, role, content, timestamp, image) VALUES (?, ?, ?, ?, ?)",
+                (
+                    conversation_id,
+                    message.role,
+                    message.content,
+                    message.timestamp.isoformat(),
+                    message.image,
+                ),
+            )
+            message.id = cursor.lastrowid
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def get_recent_messages(username: str, since: datetime, limit: int) -> List[RecentMessage]:
+    """The user's newest messages across all conversations since `since`, oldest first.
+
+    Served by idx_conversations_username and a range scan on
+    idx_messages_conversation_timestamp per conversation.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+    SELECT m.conversation_id, m.id, m.role, m.content, m.timestamp, m.image
+    FROM conversations c
+    JOIN messages m ON m.conversation_id = c.id
+    WHERE c.username = ? AND m.timestamp >= ?
+    ORDER BY m.timestamp DESC, m.id DESC
+    LIMIT ?
+    """,
+        (username, since.isoformat(), limit),
+    )
+    return [RecentMessage(*row) for row in reversed(cursor.fetchall())]
+
+
+def get_user_conversation_summaries(
+    username: str,
+    limit: Optional[int] = None,
+    before: Optional[Tuple[str, str]] = None,
+) -> List[ConversationSummary]:
+    """List conversations ordered by their last message, newest first.
+
+    `before` is a (last_timestamp, conversation_id) pair from a previous page;
+    only conversations sorting after it are returned.
+    """
+    query = """
+    SELECT c.id, c.title, COALESCE(MAX(m.timestamp), '') AS last_timestamp, COUNT(m.id)
+    FROM conversations c
+    LEFT JOIN messages m ON m.conversation_id = c.id
+    WHERE c.username = ?
+    GROUP BY c.id
+    """
+    params: List[Any] = [username]
+    if before is not None:
+        query += " HAVING last_timestamp < ? OR (last_timestamp = ? AND c.id < ?)"
+        params.extend([before[0], before[0], before[1]])
+    query += " ORDER BY last_timestamp DESC, c.id DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    conn = get_connection()
     cursor = conn.cursor()
-    # Update state and title
+    cursor.execute(query, params)
+    return [
+        ConversationSummary(
+            id=row[0],
+            title=row[1],
+            date=datetime.fromisoformat(row[2]) if row[2] else datetime.min,
+            message_count=row[3],
+        )
+        for row in cursor.fetchall()
+    ]
+
+
+def _read_aggregates(cursor: sqlite3.Cursor, username: str) -> Optional[UserAggregates]:
     cursor.execute(
-        "UPDATE conversations SET state = ?, title = ? WHERE id = ? AND username = ?",
-        (json.dumps(state), title, conversation_id, username),
+        "SELECT last_answer_date, current_streak, longest_streak, answer_days, stats FROM user_aggregates WHERE username = ?",
+        (username,),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return UserAggregates(
+        username=username,
+        last_answer_date=row[0],
+        current_streak=row[1],
+        longest_streak=row[2],
+        answer_days=row[3],
+        **json.loads(row[4]),
     )
-    # Delete existing messages
-    cursor.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
-    # Insert new messages
-    for message in messages:
+
+
+def _write_aggregates(cursor: sqlite3.Cursor, aggregates: UserAggregates):
+    cursor.execute(
+        "INSERT OR REPLACE INTO user_aggregates (username, last_answer_date, current_streak, longest_streak, answer_days, stats) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            aggregates.username,
+            aggregates.last_answer_date,
+            aggregates.current_streak,
+            aggregates.longest_streak,
+            aggregates.answer_days,
+            json.dumps({field: getattr(aggregates, field).model_dump() for field in AGGREGATE_FIELDS}),
+        ),
+    )
+
+
+def _rebuild_aggregates(cursor: sqlite3.Cursor, username: str) -> UserAggregates:
+    aggregates = UserAggregates(username=username)
+    cursor.execute(
+        "SELECT DISTINCT substr(date, 1, 10) AS day FROM daily_answers WHERE username = ? ORDER BY day",
+        (username,),
+    )
+    previous = None
+    for (day,) in cursor.fetchall():
+        current = date.fromisoformat(day)
+        if previous is not None and current == previous + timedelta(days=1):
+            aggregates.current_streak += 1
+        else:
+            aggregates.current_streak = 1
+        aggregates.longest_streak = max(aggregates.longest_streak, aggregates.current_streak)
+        aggregates.answer_days += 1
+        aggregates.last_answer_date = day
+        previous = current
+
+    for field in AGGREGATE_FIELDS:
         cursor.execute(
-            "INSERT INTO messages (conversation_id, role, content, timestamp, image) VALUES (?, ?, ?, ?, ?)",
-            (
-                conversation_id,
-                message.role,
-                message.content,
-                message.timestamp.isoformat(),
-                message.image,
-            ),
+            "SELECT value_num FROM answer_values WHERE username = ? AND field = ? AND value_num IS NOT NULL ORDER BY date",
+            (username, field),
         )
-    conn.commit()
+        stats = getattr(aggregates, field)
+        for (value,) in cursor.fetchall():
+            stats.add(value)
 
+    _write_aggregates(cursor, aggregates)
+    return aggregates
 
-def get_user_conversations(username: str) -> Dict[str, Conversation]:
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM conversations WHERE username = ?", (username,))
-    rows = cursor.fetchall()
-    conversations = {}
-    for row in rows:
-        conv = get_conversation(username, row[0])
-        if conv:
-            conversations[row[0]] = conv
-    return conversations
+
+def _update_aggregates(cursor: sqlite3.Cursor, username: str, day: str, answers: List[Answer]):
+    """Fold one day of answers into the user's aggregates.
+
+    Only a first answer on a day after the last answered one can be added
+    incrementally. Anything else, such as a corrected day, a missing record or
+    answers dated before the last one, rebuilds the aggregates from history.
+    """
+    aggregates = _read_aggregates(cursor, username)
+    if aggregates is None or aggregates.last_answer_date is None or day <= aggregates.last_answer_date:
+        _rebuild_aggregates(cursor, username)
+        return
+
+    if date.fromisoformat(day) == date.fromisoformat(aggregates.last_answer_date) + timedelta(days=1):
+        aggregates.current_streak += 1
+    else:
+        aggregates.current_streak = 1
+    aggregates.longest_streak = max(aggregates.longest_streak, aggregates.current_streak)
+    aggregates.answer_days += 1
+    aggregates.last_answer_date = day
+
+    for answer in answers:
+        if answer.field not in AGGREGATE_FIELDS:
+            continue
+        for field, value in answer_values(answer.field, answer.answer):
+            if field in AGGREGATE_FIELDS and value is not None:
+                getattr(aggregates, field).add(value)
+
+    _write_aggregates(cursor, aggregates)
 
 
 def save_daily_answers(username: str, answers: List[Answer]):
+    conn = get_connection()
     cursor = conn.cursor()
     now = datetime.now().isoformat()
-    print(answers)
     cursor.execute(
         "INSERT INTO daily_answers (username, date, answers) VALUES (?, ?, ?) ON CONFLICT(username, date) DO UPDATE SET answers = excluded.answers;",
         (username, now, json.dumps([a.model_dump() for a in answers])),
     )
+    _insert_answer_values(cursor, username, now[:10], answers)
+    _update_aggregates(cursor, username, now[:10], answers)
     conn.commit()
+    user_cache.invalidate(username)
 
 
-def get_daily_answers(username: str) -> List[DailyAnswers]:
+def get_user_aggregates(username: str) -> UserAggregates:
+    """The user's aggregates, built from history on first use if not backfilled yet."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    aggregates = _read_aggregates(cursor, username)
+    if aggregates is None:
+        if not _user_exists(cursor, username):
+            return UserAggregates(username=username)
+        aggregates = _rebuild_aggregates(cursor, username)
+        conn.commit()
+    return aggregates
+
+
+def rebuild_user_aggregates(username: str) -> UserAggregates:
+    """Recompute the user's aggregates from the full answer history."""
+    conn = get_connection()
     cursor = conn.cursor()
+    aggregates = _rebuild_aggregates(cursor, username)
+    conn.commit()
+    user_cache.invalidate(username)
+    return aggregates
+
+
+def has_daily_answers_for(username: str, day: date) -> bool:
+    """Whether the user has saved daily answers on `day`."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    # Answers are stored with a full timestamp, so match the day as a range
+    # that the (username, date) primary key index can serve.
     cursor.execute(
-        "SELECT date, answers FROM daily_answers WHERE username = ? ORDER BY date",
-        (username,),
+        "SELECT EXISTS (SELECT 1 FROM daily_answers WHERE username = ? AND date >= ? AND date < ?)",
+        (username, day.isoformat(), (day + timedelta(days=1)).isoformat()),
     )
-    rows = cursor.fetchall()
+    return bool(cursor.fetchone()[0])
+
+
+def get_answer_series(
+    username: str,
+    field: str,
+    since: date,
+    until: Optional[date] = None,
+    bucket: Literal["day", "week", "month"] = "day",
+) -> List[SeriesPoint]:
+    """Numeric values of `field` between `since` and `until`, averaged per bucket.
+
+    Weeks start on Monday and are labelled with that day, months with their
+    first day. The (username, field, date) key bounds the scan to the range.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    key = SERIES_BUCKETS[bucket]
+    cursor.execute(
+        f"""
+    SELECT {key} AS bucket, AVG(value_num), MIN(value_num), MAX(value_num), COUNT(value_num)
+    FROM answer_values
+    WHERE username = ? AND field = ? AND date >= ? AND date <= ? AND value_num IS NOT NULL
+    GROUP BY bucket
+    ORDER BY bucket
+    """,
+        (username, field, since.isoformat(), (until or date.max).isoformat()),
+    )
+    return [
+        SeriesPoint(date=row[0], average=row[1], minimum=row[2], maximum=row[3], count=row[4])
+        for row in cursor.fetchall()
+    ]
+
+
+def get_daily_answers(username: str) -> List[DailyAnswers]:
+    conn = get_connection()
+    cursor = conn.cursor()
     cursor.execute(
         "SELECT date, answers FROM daily_answers WHERE username = ? ORDER BY date",
         (username,),
     )
+    rows = cursor.fetchall()
 
     if not rows:
         return []
@@ -512,7 +1146,24 @@ def get_daily_answers(username: str) -> List[DailyAnswers]:
     ]
 
 
+def get_latest_daily_answers(username: str) -> Optional[DailyAnswers]:
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT date, answers FROM daily_answers WHERE username = ? ORDER BY date DESC LIMIT 1",
+        (username,),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return DailyAnswers(
+        date=row[0],
+        answers=[Answer.model_validate(item) for item in json.loads(row[1])],
+    )
+
+
 def save_daily_questions(username: str, questions: List[Dict[str, Any]]):
+    conn = get_connection()
     cursor = conn.cursor()
     today = datetime.now().date().isoformat()
     cursor.execute(
@@ -523,6 +1174,7 @@ def save_daily_questions(username: str, questions: List[Dict[str, Any]]):
 
 
 def get_daily_questions(username: str) -> Optional[List[Dict[str, Any]]]:
+    conn = get_connection()
     cursor = conn.cursor()
     today = datetime.now().date().isoformat()
     cursor.execute(
@@ -536,6 +1188,7 @@ def get_daily_questions(username: str) -> Optional[List[Dict[str, Any]]]:
 
 
 def save_daily_dashboard_widgets(username: str, widgets: List[Dict[str, Any]]):
+    conn = get_connection()
     cursor = conn.cursor()
     today = datetime.now().date().isoformat()
     cursor.execute(
@@ -546,6 +1199,7 @@ def save_daily_dashboard_widgets(username: str, widgets: List[Dict[str, Any]]):
 
 
 def get_daily_dashboard_widgets(username: str) -> Optional[List[Dict[str, Any]]]:
+    conn = get_connection()
     cursor = conn.cursor()
     today = datetime.now().date().isoformat()
     cursor.execute(
@@ -559,15 +1213,18 @@ def get_daily_dashboard_widgets(username: str) -> Optional[List[Dict[str, Any]]]
 
 
 def update_recent_summary(username: str, summary: str):
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute(
         "UPDATE users SET recent_summary = ? WHERE username = ?",
         (summary, username),
     )
     conn.commit()
+    user_cache.invalidate(username)
 
 
 def get_recent_summary(username: str) -> Optional[str]:
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT recent_summary FROM users WHERE username = ?", (username,))
     row = cursor.fetchone()
@@ -577,84 +1234,51 @@ def get_recent_summary(username: str) -> Optional[str]:
 
 
 def get_all_users() -> List[str]:
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT username FROM users")
     rows = cursor.fetchall()
     return [row[0] for row in rows]
 
 
-def generate_daily_questions_for_all_users():
-    from .utils import get_recent_messages
-    from .state import questions_graph
-
-    users = get_all_users()
-    for username in users:
-        user = get_user(username)
-        if user is None:
-            continue
-
-        base_questions = [
-            {
-                "question": "How are you?",
-                "type": "enum",
-                "options": [
-                    {"value": "verygood", "label": "Very good"},
-                    {"value": "good", "label": "Good"},
-                    {"value": "okay", "label": "Okay"},
-                    {"value": "notgood", "label": "Not good"},
-                    {"value": "bad", "label": "Bad"},
-                ],
-                "optional": False,
-                "field": "mood",
-            },
-            {
-                "question": "What is your blood pressure?",
-                "type": "text",
-                "options": None,
-                "optional": False,
-                "field": "blood_pressure",
-            },
-            {
-                "question": "What is your weight?",
-                "type": "number",
-                "options": None,
-                "optional": False,
-                "field": "weight",
-            },
-            {
-                "question": "Did you take any medication today?",
-                "type": "enum",
-                "options": [
-                    {"value": "yes", "label": "Yes"},
-                    {"value": "no", "label": "No"},
-                ],
-                "optional": False,
-                "field": "medication",
-            },
-        ]
-
-        recent_messages = get_recent_messages(username)
-        additional_questions = questions_graph.chat(
-            recent_messages, base_questions, user
-        )
-        additional_questions = additional_questions[:2]
-        all_questions = base_questions + additional_questions
+def get_batch_checkpoints(job: str, run_date: str) -> set:
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT username FROM batch_checkpoints WHERE job = ? AND date = ?", (job, run_date)
+    )
+    return {row[0] for row in cursor.fetchall()}
 
-        save_daily_questions(username, all_questions)
 
+def save_batch_checkpoint(job: str, run_date: str, username: str):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT OR IGNORE INTO batch_checkpoints (job, date, username, finished_at) VALUES (?, ?, ?, ?)",
+        (job, run_date, username, datetime.now().isoformat()),
+    )
+    conn.commit()
 
-def generate_daily_dashboard_for_all_users():
-    from .clients.llm import LLM
-    from .graphs.dashboardgraph import DashboardGraph
 
-    users = get_all_users()
-    llm = LLM()
-    graph = DashboardGraph(llm.llm)
+def acquire_job_lock(job: str, owner: str, ttl_seconds: float) -> bool:
+    """Take the lock for `job` unless another owner holds an unexpired one."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    now = time.time()
+    cursor.execute(
+        """
+    INSERT INTO job_locks (job, owner, expires_at) VALUES (?, ?, ?)
+    ON CONFLICT(job) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+    WHERE job_locks.expires_at < ? OR job_locks.owner = excluded.owner
+    """,
+        (job, owner, now + ttl_seconds, now),
+    )
+    conn.commit()
+    return cursor.rowcount > 0
 
-    for username in users:
-        user = get_user(username)
-        if user is None:
-            continue
 
-        widgets = graph.run(user.__dict__)
-        save_daily_dashboard_widgets(username, [widget.__dict__ for widget in widgets])
+def release_job_lock(job: str, owner: str):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM job_locks WHERE job = ? AND owner = ?", (job, owner))
+    conn.commit()
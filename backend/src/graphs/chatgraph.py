@@ -1,6 +1,7 @@
-from typing import TypedDict, List, Dict, Any
+from typing import TypedDict, List, Dict, Any, Optional
 from langgraph.graph import StateGraph, END, START
-from langchain_core.messages import BaseMessage, ToolMessage, SystemMessage
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
 from ..tools import (
     retrieve_context,
     get_calendar,
@@ -8,6 +9,8 @@ from ..tools import (
     remove_calendar_event,
     edit_calendar_event,
     add_meal_to_calendar,
+    add_meals_bulk,
+    replace_meals_for_range,
     get_meals_for_day,
     edit_meal,
     remove_meal,
@@ -19,9 +22,11 @@ class AgentState(TypedDict):
     messages: List[BaseMessage]
     daily_answers: List[Dict[str, Any]]
     registration_answers: List[Dict[str, str]]
+    conversation_summary: Optional[str]
+    username: Optional[str]
 
 
-from .graph import BaseGraph
+from .graph import BaseGraph, run_tool_loop, arun_tool_loop, astream_tool_loop
 
 
 class ChatGraph(BaseGraph):
@@ -34,13 +39,18 @@ class ChatGraph(BaseGraph):
                 "remove_calendar_event": remove_calendar_event,
                 "edit_calendar_event": edit_calendar_event,
                 "add_meal_to_calendar": add_meal_to_calendar,
+                "add_meals_bulk": add_meals_bulk,
+                "replace_meals_for_range": replace_meals_for_range,
                 "get_meals_for_day": get_meals_for_day,
                 "edit_meal": edit_meal,
                 "remove_meal": remove_meal,
             }
             self.llm = llm.bind_tools(list(self.tools.values()))
             workflow = StateGraph(state_schema=AgentState)
-            workflow.add_node("supervisor", self.supervisor_agent)
+            workflow.add_node(
+                "supervisor",
+                RunnableLambda(self.supervisor_agent, afunc=self.asupervisor_agent),
+            )
             workflow.add_edge(START, "supervisor")
             workflow.add_edge("supervisor", END)
             self.graph = workflow.compile()
@@ -49,46 +59,81 @@ class ChatGraph(BaseGraph):
             logger.error(f"Failed to initialize graph: {e}")
             raise
 
-    def chat(self, history, daily_answers=None, registration_answers=None):
+    def chat(self, history, daily_answers=None, registration_answers=None, conversation_summary=None, username=None):
         try:
-            if daily_answers is None:
-                daily_answers = []
-            if registration_answers is None:
-                registration_answers = []
             logger.debug(f"Invoking graph with {len(history)} messages")
-            result = self.graph.invoke({"messages": history, "daily_answers": daily_answers, "registration_answers": registration_answers})
-            ai_response = result["messages"][-1]
+            result = self.graph.invoke(self._initial_state(history, daily_answers, registration_answers, conversation_summary, username))
             logger.debug("Graph invocation successful")
-            if isinstance(ai_response, dict):
-                return ai_response.get("content", str(ai_response))
-            else:
-                return ai_response.content
+            return self._response_content(result)
         except Exception as e:
             logger.error(f"Error during graph chat: {e}")
             return "An error occurred while processing your request."
 
+    async def achat(self, history, daily_answers=None, registration_answers=None, conversation_summary=None, username=None):
+        try:
+            logger.debug(f"Invoking graph asynchronously with {len(history)} messages")
+            result = await self.graph.ainvoke(self._initial_state(history, daily_answers, registration_answers, conversation_summary, username))
+            logger.debug("Graph invocation successful")
+            return self._response_content(result)
+        except Exception as e:
+            logger.error(f"Error during graph chat: {e}")
+            return "An error occurred while processing your request."
+
+    async def astream(self, history, daily_answers=None, registration_answers=None, conversation_summary=None, username=None):
+        """Stream the agent's answer; see astream_tool_loop for the event format."""
+        state = self._initial_state(history, daily_answers, registration_answers, conversation_summary, username)
+        messages_with_context = [self._system_message(state)] + history
+        logger.debug(f"Streaming graph with {len(history)} messages")
+        async for event in astream_tool_loop(self.llm, self.tools, messages_with_context, self._injected_args(state)):
+            yield event
+
+    @staticmethod
+    def _initial_state(history, daily_answers, registration_answers, conversation_summary, username) -> AgentState:
+        return {
+            "messages": history,
+            "daily_answers": daily_answers if daily_answers is not None else [],
+            "registration_answers": registration_answers if registration_answers is not None else [],
+            "conversation_summary": conversation_summary,
+            "username": username,
+        }
+
+    @staticmethod
+    def _response_content(result):
+        ai_response = result["messages"][-1]
+        if isinstance(ai_response, dict):
+            return ai_response.get("content", str(ai_response))
+        else:
+            return ai_response.content
+
+    @staticmethod
+    def system_prompt(daily_answers, registration_answers, conversation_summary=None) -> str:
+        context_msg = f"You are a healthcare agent inside a product from 316er studios. You get user messages and potentially images. Try to match the tone of the user. If the user is scarred because of a illness try to support him. If he needs to go to the doctor try to motivate him. Try to identify potentiall health issues early on. Add events to the calendar if needed. Replan the users diet on request, writing all meals at once with replace_meals_for_range. Be a proactive agent. User's daily answers: {daily_answers}. Registration info: {registration_answers}."
+        if conversation_summary:
+            context_msg += f" Summary of the earlier conversation: {conversation_summary}"
+        return context_msg
+
+    def _system_message(self, state: AgentState) -> SystemMessage:
+        return SystemMessage(
+            content=self.system_prompt(
+                state["daily_answers"],
+                state["registration_answers"],
+                state.get("conversation_summary"),
+            )
+        )
+
+    @staticmethod
+    def _injected_args(state: AgentState) -> Dict[str, Any]:
+        # Tools that must only see the caller's own data take the username from here
+        return {"username": state.get("username")}
+
     def supervisor_agent(self, state: AgentState):
-        context_msg = f"You are a healthcare agent inside a product from 316er studios. You get user messages and potentially images. Try to match the tone of the user. If the user is scarred because of a illness try to support him. If he needs to go to the doctor try to motivate him. Try to identify potentiall health issues early on. Add events to the calendar if needed. Replan the users diet on request. Be a proactive agent. User's daily answers: {state['daily_answers']}. Registration info: {state['registration_answers']}."
-        system_message = SystemMessage(content=context_msg)
-        messages_with_context = [system_message] + state["messages"]
-
-        response = self.llm.invoke(messages_with_context)
-        messages = messages_with_context + [response]
-        while hasattr(response, "tool_calls") and response.tool_calls:
-            for tool_call in response.tool_calls:
-                tool_name = tool_call["name"]
-                args = tool_call["args"]
-                logger.debug(f"Executing tool: {tool_name} with args: {args}")
-
-                tool_func = self.tools.get(tool_name)
-                if tool_func:
-                    result = tool_func.run(args)
-                else:
-                    result = f"Unknown tool: {tool_name}"
-
-                logger.debug(f"Tool result: {result}")
-                tool_message = ToolMessage(content=result, tool_call_id=tool_call["id"], name=tool_call["name"])
-                messages.append(tool_message)
-            response = self.llm.invoke(messages)
-            messages = messages + [response]
+        messages_with_context = [self._system_message(state)] + state["messages"]
+
+        messages = run_tool_loop(self.llm, self.tools, messages_with_context, self._injected_args(state))
+        return {"messages": messages}
+
+    async def asupervisor_agent(self, state: AgentState):
+        messages_with_context = [self._system_message(state)] + state["messages"]
+
+        messages = await arun_tool_loop(self.llm, self.tools, messages_with_context, self._injected_args(state))
         return {"messages": messages}
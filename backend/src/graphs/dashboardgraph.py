@@ -3,11 +3,16 @@ from os import wait
 from typing import Any, Optional, TypedDict, List, Dict, Literal
 from langgraph.graph import StateGraph, END, START
 from langchain_core.messages import SystemMessage
+from langchain_core.runnables import RunnableLambda
 from pydantic import BaseModel, Field
-from ..config import logger
+from ..config import CONFIG, logger
 import json
-from ..utils import calculate_streak, get_next_appointment
-from ..db import Event, get_daily_answers
+from datetime import datetime, timedelta
+from ..utils import get_next_appointment
+from ..db import ANSWER_SCORES, Event, SeriesPoint, get_answer_series, get_user_aggregates
+from .. import async_db
+
+MOOD_LABELS = {score: label for label, score in ANSWER_SCORES["mood"].items()}
 
 
 class Widget(BaseModel):
@@ -26,6 +31,7 @@ class WidgetResponse(BaseModel):
 class AgentState(TypedDict):
     user_data: Dict
     widgets: List[Widget]
+    raise_errors: bool
 
 
 class DashboardGraph(ABC):
@@ -34,7 +40,10 @@ class DashboardGraph(ABC):
             self.llm = llm
             self.structured_llm = self.llm.with_structured_output(WidgetResponse)
             workflow = StateGraph(state_schema=AgentState)
-            workflow.add_node("widget_generator", self.widget_agent)
+            workflow.add_node(
+                "widget_generator",
+                RunnableLambda(self.widget_agent, afunc=self.awidget_agent),
+            )
             workflow.add_edge(START, "widget_generator")
             workflow.add_edge("widget_generator", END)
             self.graph = workflow.compile()
@@ -48,15 +57,11 @@ class DashboardGraph(ABC):
             logger.debug(
                 f"Invoking DashboardGraph with user data for {user_data.get('username', 'unknown')}"
             )
-            # Serialize events to dicts for JSON compatibility
-            user_data_copy = user_data.copy()
-            user_data_copy["events"] = [
-                event.model_dump(mode="json") for event in user_data["events"]
-            ]
             result = self.graph.invoke(
                 {
-                    "user_data": user_data_copy,
+                    "user_data": self._serializable_user_data(user_data),
                     "widgets": [],
+                    "raise_errors": False,
                 }
             )
             widgets = result["widgets"]
@@ -66,28 +71,48 @@ class DashboardGraph(ABC):
             logger.error(f"Error during DashboardGraph run: {e}")
             return []
 
-    def widget_agent(self, state: AgentState):
-        user_data = state["user_data"]
-        username = user_data.get("username")
+    async def arun(self, user_data: Dict, raise_errors: bool = False) -> List[Widget]:
+        """Generate widgets; with `raise_errors` LLM failures raise instead of producing fallback widgets."""
+        try:
+            logger.debug(
+                f"Invoking DashboardGraph asynchronously with user data for {user_data.get('username', 'unknown')}"
+            )
+            result = await self.graph.ainvoke(
+                {
+                    "user_data": self._serializable_user_data(user_data),
+                    "widgets": [],
+                    "raise_errors": raise_errors,
+                }
+            )
+            widgets = result["widgets"]
+            logger.debug("DashboardGraph invocation successful")
+            return widgets
+        except Exception as e:
+            logger.error(f"Error during DashboardGraph run: {e}")
+            if raise_errors:
+                raise
+            return []
 
-        daily_answers = get_daily_answers(username) if username else []
-        streak = calculate_streak(daily_answers)
+    @staticmethod
+    def _serializable_user_data(user_data: Dict) -> Dict:
+        # Serialize events to dicts for JSON compatibility
+        user_data_copy = user_data.copy()
+        user_data_copy["events"] = [
+            event.model_dump(mode="json") for event in user_data["events"]
+        ]
+        return user_data_copy
 
+    @staticmethod
+    def _default_widgets(user_data: Dict, streak: int, moods: List[SeriesPoint]) -> List[Widget]:
         events = [Event.model_validate(event) for event in user_data.get("events", [])]
         next_appt = get_next_appointment(events)
 
-        logger.info(daily_answers)
-
         feelings = [
-            {"timestamp": daily.date, "value": elem.answer}
-            for daily in daily_answers
-            for elem in daily.answers
-            if elem.field == "mood"
+            {"timestamp": point.date, "value": MOOD_LABELS[round(point.average)]}
+            for point in moods
         ]
 
-        logger.info(feelings)
-
-        default_widgets = [
+        return [
             Widget(
                 title="Mood",
                 type="graph",
@@ -113,7 +138,9 @@ class DashboardGraph(ABC):
             ),
         ]
 
-        messages = [
+    @staticmethod
+    def _prompt(user_data: Dict):
+        return [
             SystemMessage(
                 content=f"""[Role]
 You are a health dashboard assistant. Based on the user's profile data, generate exactly 4 personalized widgets with really useful tips and insigs for the user.
@@ -128,17 +155,53 @@ Provide concise, actionable insights. Type must always be "text". Keep body unde
             ),
         ]
 
+    @staticmethod
+    def _fallback_widgets() -> List[Widget]:
+        return [
+            Widget(title="Health Overview", body="Generation failed."),
+            Widget(title="Goals", body="Generation failed."),
+            Widget(title="Reminders", body="Generation failed."),
+            Widget(title="Stats", body="Generation failed."),
+        ]
+
+    def widget_agent(self, state: AgentState):
+        user_data = state["user_data"]
+        username = user_data.get("username")
+
+        today = datetime.now().date()
+        since = today - timedelta(days=CONFIG["DASHBOARD_GRAPH_DAYS"])
+        streak = get_user_aggregates(username).streak(today) if username else 0
+        moods = get_answer_series(username, "mood", since) if username else []
+        default_widgets = self._default_widgets(user_data, streak, moods)
+
+        try:
+            response = self.structured_llm.invoke(self._prompt(user_data))
+            ai_widgets = response.widgets
+        except Exception as e:
+            logger.error(f"Failed to generate structured widgets: {e}")
+            ai_widgets = self._fallback_widgets()
+
+        state["widgets"] = default_widgets + ai_widgets
+        return state
+
+    async def awidget_agent(self, state: AgentState):
+        user_data = state["user_data"]
+        username = user_data.get("username")
+
+        today = datetime.now().date()
+        since = today - timedelta(days=CONFIG["DASHBOARD_GRAPH_DAYS"])
+        streak = (await async_db.get_user_aggregates(username)).streak(today) if username else 0
+        moods = await async_db.get_answer_series(username, "mood", since) if username else []
+        default_widgets = self._default_widgets(user_data, streak, moods)
+
         try:
-            response = self.structured_llm.invoke(messages)
+            response = await self.structured_llm.ainvoke(self._prompt(user_data))
             ai_widgets = response.widgets
         except Exception as e:
             logger.error(f"Failed to generate structured widgets: {e}")
-            ai_widgets = [
-                Widget(title="Health Overview", body="Generation failed."),
-                Widget(title="Goals", body="Generation failed."),
-                Widget(title="Reminders", body="Generation failed."),
-                Widget(title="Stats", body="Generation failed."),
-            ]
+            if state.get("raise_errors"):
+                raise
+            ai_widgets = self._fallback_widgets()
 
         state["widgets"] = default_widgets + ai_widgets
         return state
@@ -1,7 +1,8 @@
-from typing import TypedDict, List, Dict, Any
+from typing import Optional, TypedDict, List, Dict, Any
 from langgraph.graph import StateGraph, END, START
-from langchain_core.messages import BaseMessage, ToolMessage, SystemMessage, HumanMessage, AIMessage
-from ..tools import retrieve_context, add_meal_to_calendar, get_meals_for_day, edit_meal, remove_meal
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
+from ..tools import retrieve_context, add_meal_to_calendar, add_meals_bulk, replace_meals_for_range, get_meals_for_day, edit_meal, remove_meal
 from ..config import logger
 
 
@@ -10,9 +11,10 @@ class AgentState(TypedDict):
     daily_answers: List[Dict[str, Any]]
     registration_answers: List[Dict[str, str]]
     diet_plan: Dict[str, Any]
+    username: Optional[str]
 
 
-from .graph import BaseGraph
+from .graph import BaseGraph, run_tool_loop, arun_tool_loop
 
 
 def convert_messages_to_langchain(messages: List[Any]) -> List[BaseMessage]:
@@ -37,13 +39,18 @@ class DietGraph(BaseGraph):
         try:
             self.tools = {
                 "add_meal_to_calendar": add_meal_to_calendar,
+                "add_meals_bulk": add_meals_bulk,
+                "replace_meals_for_range": replace_meals_for_range,
                 "get_meals_for_day": get_meals_for_day,
                 "edit_meal": edit_meal,
                 "remove_meal": remove_meal,
             }
             self.llm = llm.bind_tools(list(self.tools.values()))
             workflow = StateGraph(state_schema=AgentState)
-            workflow.add_node("supervisor", self.supervisor_agent)
+            workflow.add_node(
+                "supervisor",
+                RunnableLambda(self.supervisor_agent, afunc=self.asupervisor_agent),
+            )
             workflow.add_edge(START, "supervisor")
             workflow.add_edge("supervisor", END)
             self.graph = workflow.compile()
@@ -52,62 +59,70 @@ class DietGraph(BaseGraph):
             logger.error(f"Failed to initialize DietGraph: {e}")
             raise
 
-    def chat(self, history, daily_answers=None, registration_answers=None, diet_plan=None):
+    def chat(self, history, daily_answers=None, registration_answers=None, diet_plan=None, username=None):
         try:
-            if daily_answers is None:
-                daily_answers = []
-            if registration_answers is None:
-                registration_answers = []
-            if diet_plan is None:
-                diet_plan = {}
-            # Convert history to LangChain message format
-            langchain_history = convert_messages_to_langchain(history)
-            logger.debug(f"Invoking DietGraph with {len(langchain_history)} messages")
-            result = self.graph.invoke(
-                {
-                    "messages": langchain_history,
-                    "daily_answers": daily_answers,
-                    "registration_answers": registration_answers,
-                    "diet_plan": diet_plan,
-                }
-            )
-            ai_response = result["messages"][-1]
+            initial_state = self._initial_state(history, daily_answers, registration_answers, diet_plan, username)
+            logger.debug(f"Invoking DietGraph with {len(initial_state['messages'])} messages")
+            result = self.graph.invoke(initial_state)
             logger.debug("DietGraph invocation successful")
-            if isinstance(ai_response, dict):
-                return ai_response.get("content", str(ai_response))
-            else:
-                return ai_response.content
+            return self._response_content(result)
         except Exception as e:
             logger.error(f"Error during DietGraph chat: {e}")
             return "An error occurred while processing your diet planning request."
 
-    def supervisor_agent(self, state: AgentState):
+    async def achat(self, history, daily_answers=None, registration_answers=None, diet_plan=None, username=None):
+        try:
+            initial_state = self._initial_state(history, daily_answers, registration_answers, diet_plan, username)
+            logger.debug(f"Invoking DietGraph asynchronously with {len(initial_state['messages'])} messages")
+            result = await self.graph.ainvoke(initial_state)
+            logger.debug("DietGraph invocation successful")
+            return self._response_content(result)
+        except Exception as e:
+            logger.error(f"Error during DietGraph chat: {e}")
+            return "An error occurred while processing your diet planning request."
+
+    @staticmethod
+    def _initial_state(history, daily_answers, registration_answers, diet_plan, username) -> AgentState:
+        return {
+            # Convert history to LangChain message format
+            "messages": convert_messages_to_langchain(history),
+            "daily_answers": daily_answers if daily_answers is not None else [],
+            "registration_answers": registration_answers if registration_answers is not None else [],
+            "diet_plan": diet_plan if diet_plan is not None else {},
+            "username": username,
+        }
+
+    @staticmethod
+    def _response_content(result):
+        ai_response = result["messages"][-1]
+        if isinstance(ai_response, dict):
+            return ai_response.get("content", str(ai_response))
+        else:
+            return ai_response.content
+
+    def _system_message(self, state: AgentState) -> SystemMessage:
         days = state['diet_plan'].get('days', 1)
         start_date = state['diet_plan'].get('start_date', 'today')
         context_msg = f"User's daily answers: {state['daily_answers']}. Registration info: {state['registration_answers']}. Current diet plan: {state['diet_plan']}."
-        system_message = SystemMessage(
+        return SystemMessage(
             content=context_msg
             + f" You are a diet planning assistant. Help the user plan their meals for the next {days} days starting from {start_date} based on their health information and goals. Avoid any meals that the user does not like. Keep going until you have planned meals for ALL {days} days starting from {start_date}."
+            + " Write the whole plan with a single replace_meals_for_range call covering all days, instead of adding meals one by one."
         )
-        messages_with_context = [system_message] + state["messages"]
-
-        response = self.llm.invoke(messages_with_context)
-        messages = messages_with_context + [response]
-        while hasattr(response, "tool_calls") and response.tool_calls:
-            for tool_call in response.tool_calls:
-                tool_name = tool_call["name"]
-                args = tool_call["args"]
-                logger.debug(f"Executing tool: {tool_name} with args: {args}")
-
-                tool_func = self.tools.get(tool_name)
-                if tool_func:
-                    result = tool_func.run(args)
-                else:
-                    result = f"Unknown tool: {tool_name}"
-
-                logger.debug(f"Tool result: {result}")
-                tool_message = ToolMessage(content=result, tool_call_id=tool_call["id"], name=tool_call["name"])
-                messages.append(tool_message)
-            response = self.llm.invoke(messages)
-            messages = messages + [response]
+
+    @staticmethod
+    def _injected_args(state: AgentState) -> Dict[str, Any]:
+        # Tools that must only see the caller's own data take the username from here
+        return {"username": state.get("username")}
+
+    def supervisor_agent(self, state: AgentState):
+        messages_with_context = [self._system_message(state)] + state["messages"]
+
+        messages = run_tool_loop(self.llm, self.tools, messages_with_context, self._injected_args(state))
+        return {"messages": messages}
+
+    async def asupervisor_agent(self, state: AgentState):
+        messages_with_context = [self._system_message(state)] + state["messages"]
+
+        messages = await arun_tool_loop(self.llm, self.tools, messages_with_context, self._injected_args(state))
         return {"messages": messages}
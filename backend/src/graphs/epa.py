@@ -2,6 +2,7 @@ from abc import ABC
 from typing import TypedDict
 from langgraph.graph import StateGraph, END, START
 from langchain_core.messages import SystemMessage
+from langchain_core.runnables import RunnableLambda
 from ..config import logger
 
 
@@ -15,7 +16,10 @@ class EPAGraph(ABC):
         try:
             self.llm = llm
             workflow = StateGraph(state_schema=AgentState)
-            workflow.add_node("summarizer", self.summary_agent)
+            workflow.add_node(
+                "summarizer",
+                RunnableLambda(self.summary_agent, afunc=self.asummary_agent),
+            )
             workflow.add_edge(START, "summarizer")
             workflow.add_edge("summarizer", END)
             self.graph = workflow.compile()
@@ -40,9 +44,26 @@ class EPAGraph(ABC):
             logger.error(f"Error during graph chat: {e}")
             return ""
 
-    def summary_agent(self, state: AgentState):
+    async def arun(self, epa):
+        try:
+            logger.debug(f"Invoking graph asynchronously with {len(epa)} long ePA")
+            result = await self.graph.ainvoke(
+                {
+                    "epa": epa,
+                    "summary": "",
+                }
+            )
+            ai_response = result["summary"]
+            logger.debug("Graph invocation successful")
+            return ai_response
+        except Exception as e:
+            logger.error(f"Error during graph chat: {e}")
+            return ""
+
+    @staticmethod
+    def _prompt(state: AgentState):
         epa = state["epa"]
-        messages = [
+        return [
             SystemMessage(
                 content=f"""[Role]
 You are a clinical summary AI assistant. Your task is to read a full electronic patient record (EPR) and generate a comprehensive, accurate, and concise summary containing all important medical information about the patient. The summary should serve as a reliable context source for future interactions or automated reasoning.
@@ -53,7 +74,12 @@ You are a clinical summary AI assistant. Your task is to read a full electronic
             ),
         ]
 
-        summary_response = self.llm.invoke(messages)
-        summary_msg = f"Conversation Summary: {summary_response.content}"
-        state["summary"] = summary_msg
+    def summary_agent(self, state: AgentState):
+        summary_response = self.llm.invoke(self._prompt(state))
+        state["summary"] = f"Conversation Summary: {summary_response.content}"
+        return state
+
+    async def asummary_agent(self, state: AgentState):
+        summary_response = await self.llm.ainvoke(self._prompt(state))
+        state["summary"] = f"Conversation Summary: {summary_response.content}"
         return state
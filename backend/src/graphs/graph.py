@@ -1,5 +1,13 @@
 from abc import ABC, abstractmethod
-from typing import Any
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.tools import BaseTool
+from ..config import CONFIG, logger
 
 
 class BaseGraph(ABC):
@@ -9,4 +17,314 @@ class BaseGraph(ABC):
 
     @abstractmethod
     def chat(self, *args, **kwargs) -> Any:
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    async def achat(self, *args, **kwargs) -> Any:
+        pass
+
+
+class ToolExecutor(Executor):
+    """Bounded thread pool for tool calls that keeps serving while timed-out calls run on.
+
+    A tool that is already running cannot be cancelled, so a call that times
+    out keeps its thread until the tool returns. Once a call has run for
+    `timeout` seconds, its slot is given back and the call moves to one of
+    `overrun` extra threads. At most `concurrency` calls run within their
+    time, plus at most `overrun` that outlived it. Only when the extra
+    threads are used up do stuck calls keep their slots, and later calls
+    wait in the queue.
+    """
+
+    def __init__(self, concurrency: int, overrun: int, timeout: float, thread_name_prefix: str = ""):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=concurrency + overrun, thread_name_prefix=thread_name_prefix)
+        self._lock = threading.Lock()
+        self._free = concurrency
+        self._overrun_free = overrun
+        self._pending: Deque[Tuple[Future, Callable, tuple, dict]] = deque()
+        # Start time and whether the call gave its slot back, per running call
+        self._running: Dict[Future, List] = {}
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        with self._lock:
+            self._pending.append((future, fn, args, kwargs))
+        self.dispatch()
+        return future
+
+    def dispatch(self):
+        """Start queued calls on free slots, first freeing the slots of overdue calls."""
+        with self._lock:
+            if self._pending and not self._free:
+                self._release_overdue()
+            while self._free and self._pending:
+                future, fn, args, kwargs = self._pending.popleft()
+                # Calls cancelled while queued are dropped
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._free -= 1
+                self._running[future] = [time.monotonic(), False]
+                self._executor.submit(self._run, future, fn, args, kwargs)
+
+    def _release_overdue(self):
+        now = time.monotonic()
+        overdue = [state for state in self._running.values() if not state[1] and now - state[0] >= self.timeout]
+        moved = overdue[: self._overrun_free]
+        for state in moved:
+            state[1] = True
+        self._overrun_free -= len(moved)
+        self._free += len(moved)
+        if len(moved) < len(overdue):
+            logger.warning("All tool overrun threads are busy, timed-out tool calls keep their slots")
+
+    def _run(self, future: Future, fn: Callable, args: tuple, kwargs: dict):
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                _, released = self._running.pop(future)
+                if released:
+                    self._overrun_free += 1
+                else:
+                    self._free += 1
+            self.dispatch()
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        if cancel_futures:
+            with self._lock:
+                pending, self._pending = self._pending, deque()
+            for future, *_ in pending:
+                future.cancel()
+        self._executor.shutdown(wait=wait)
+
+
+tool_executor = ToolExecutor(
+    CONFIG["TOOL_CONCURRENCY"],
+    CONFIG["TOOL_OVERRUN_THREADS"],
+    CONFIG["TOOL_TURN_TIMEOUT"],
+    thread_name_prefix="tool",
+)
+
+TOOL_LIMIT_REACHED_MESSAGE = "I could not finish all steps of this request. Please try again with a smaller request."
+
+
+def _tool_args(tool_func: Optional[BaseTool], tool_call: Dict[str, Any], injected_args: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """The model's arguments plus the server-side values of the tool's injected arguments.
+
+    Arguments annotated with InjectedToolArg are hidden from the model, so
+    values such as the authenticated username can only come from here.
+    """
+    args = dict(tool_call["args"])
+    if tool_func is None or not injected_args:
+        return args
+    accepted = tool_func.get_input_schema().model_fields
+    visible = getattr(tool_func.tool_call_schema, "model_fields", {})
+    for name, value in injected_args.items():
+        if name in accepted and name not in visible:
+            args[name] = value
+    return args
+
+
+def execute_tool_call(
+    tools: Dict[str, BaseTool], tool_call: Dict[str, Any], injected_args: Optional[Dict[str, Any]] = None
+) -> ToolMessage:
+    tool_name = tool_call["name"]
+    tool_func = tools.get(tool_name)
+    args = _tool_args(tool_func, tool_call, injected_args)
+    logger.debug(f"Executing tool: {tool_name} with args: {tool_call['args']}")
+
+    if tool_func:
+        result = tool_func.run(args)
+    else:
+        result = f"Unknown tool: {tool_name}"
+
+    logger.debug(f"Tool result: {result}")
+    return ToolMessage(content=result, tool_call_id=tool_call["id"], name=tool_name)
+
+
+async def aexecute_tool_call(
+    tools: Dict[str, BaseTool], tool_call: Dict[str, Any], injected_args: Optional[Dict[str, Any]] = None
+) -> ToolMessage:
+    tool_name = tool_call["name"]
+    tool_func = tools.get(tool_name)
+    args = _tool_args(tool_func, tool_call, injected_args)
+    logger.debug(f"Executing tool: {tool_name} with args: {tool_call['args']}")
+
+    if tool_func and getattr(tool_func, "coroutine", None):
+        result = await tool_func.arun(args)
+    elif tool_func:
+        # Sync tools share the bounded tool pool instead of the loop's default executor
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(tool_executor, tool_func.run, args)
+    else:
+        result = f"Unknown tool: {tool_name}"
+
+    logger.debug(f"Tool result: {result}")
+    return ToolMessage(content=result, tool_call_id=tool_call["id"], name=tool_name)
+
+
+def _failed_tool_message(tool_call: Dict[str, Any], reason: str) -> ToolMessage:
+    logger.error(f"Tool {tool_call['name']} failed: {reason}")
+    return ToolMessage(
+        content=f"Tool {tool_call['name']} failed: {reason}",
+        tool_call_id=tool_call["id"],
+        name=tool_call["name"],
+    )
+
+
+def execute_tool_calls(
+    tools: Dict[str, BaseTool], tool_calls: List[Dict[str, Any]], injected_args: Optional[Dict[str, Any]] = None
+) -> List[ToolMessage]:
+    """Run all tool calls of one model turn concurrently.
+
+    Results are returned in the order of `tool_calls`. Calls still running after
+    TOOL_TURN_TIMEOUT seconds are reported to the model as timed out. Queued
+    calls are cancelled; running ones cannot be stopped and finish on one of
+    the tool executor's overrun threads.
+    """
+    futures = [tool_executor.submit(execute_tool_call, tools, tool_call, injected_args) for tool_call in tool_calls]
+    wait(futures, timeout=CONFIG["TOOL_TURN_TIMEOUT"])
+
+    results = []
+    for tool_call, future in zip(tool_calls, futures):
+        if not future.done():
+            future.cancel()
+            results.append(_failed_tool_message(tool_call, "timed out"))
+        elif future.exception() is not None:
+            results.append(_failed_tool_message(tool_call, str(future.exception())))
+        else:
+            results.append(future.result())
+    if any(not future.done() for future in futures):
+        # Hand the slots of the calls that are still running to queued work
+        tool_executor.dispatch()
+    return results
+
+
+async def aexecute_tool_calls(
+    tools: Dict[str, BaseTool], tool_calls: List[Dict[str, Any]], injected_args: Optional[Dict[str, Any]] = None
+) -> List[ToolMessage]:
+    """Async counterpart of execute_tool_calls with the same ordering and timeout."""
+    semaphore = asyncio.Semaphore(CONFIG["TOOL_CONCURRENCY"])
+
+    async def bounded(tool_call):
+        async with semaphore:
+            return await aexecute_tool_call(tools, tool_call, injected_args)
+
+    tasks = [asyncio.create_task(bounded(tool_call)) for tool_call in tool_calls]
+    await asyncio.wait(tasks, timeout=CONFIG["TOOL_TURN_TIMEOUT"])
+
+    results = []
+    for tool_call, task in zip(tool_calls, tasks):
+        if not task.done():
+            task.cancel()
+            results.append(_failed_tool_message(tool_call, "timed out"))
+        elif task.exception() is not None:
+            results.append(_failed_tool_message(tool_call, str(task.exception())))
+        else:
+            results.append(task.result())
+    if any(not task.done() for task in tasks):
+        # Hand the slots of the calls that are still running to queued work
+        tool_executor.dispatch()
+    return results
+
+
+def _has_tool_calls(response) -> bool:
+    return bool(getattr(response, "tool_calls", None))
+
+
+def run_tool_loop(
+    llm, tools: Dict[str, BaseTool], messages: List[BaseMessage], injected_args: Optional[Dict[str, Any]] = None
+) -> List[BaseMessage]:
+    """Call the model and execute its tool calls until it answers without tools.
+
+    Stops after MAX_TOOL_ITERATIONS tool turns so a model that keeps calling
+    tools cannot loop forever.
+    """
+    response = llm.invoke(messages)
+    messages = messages + [response]
+    iterations = 0
+    while _has_tool_calls(response):
+        if iterations >= CONFIG["MAX_TOOL_ITERATIONS"]:
+            logger.warning(f"Tool loop stopped after {iterations} iterations")
+            return messages + [AIMessage(content=TOOL_LIMIT_REACHED_MESSAGE)]
+        iterations += 1
+        messages.extend(execute_tool_calls(tools, response.tool_calls, injected_args))
+        response = llm.invoke(messages)
+        messages = messages + [response]
+    return messages
+
+
+async def arun_tool_loop(
+    llm, tools: Dict[str, BaseTool], messages: List[BaseMessage], injected_args: Optional[Dict[str, Any]] = None
+) -> List[BaseMessage]:
+    """Async counterpart of run_tool_loop."""
+    response = await llm.ainvoke(messages)
+    messages = messages + [response]
+    iterations = 0
+    while _has_tool_calls(response):
+        if iterations >= CONFIG["MAX_TOOL_ITERATIONS"]:
+            logger.warning(f"Tool loop stopped after {iterations} iterations")
+            return messages + [AIMessage(content=TOOL_LIMIT_REACHED_MESSAGE)]
+        iterations += 1
+        messages.extend(await aexecute_tool_calls(tools, response.tool_calls, injected_args))
+        response = await llm.ainvoke(messages)
+        messages = messages + [response]
+    return messages
+
+
+def message_text(message: BaseMessage) -> str:
+    """Text of a message whose content may be a string or a list of content blocks."""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content
+        if not isinstance(block, dict) or block.get("type") == "text"
+    )
+
+
+async def astream_tool_loop(
+    llm, tools: Dict[str, BaseTool], messages: List[BaseMessage], injected_args: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Streaming variant of arun_tool_loop.
+
+    Yields `token` events as the model produces text, `tool_start`/`tool_end`
+    events around each batch of tool calls, and a final `done` event with the
+    full text of the last answer.
+    """
+    messages = list(messages)
+    iterations = 0
+    while True:
+        response = None
+        async for chunk in llm.astream(messages):
+            response = chunk if response is None else response + chunk
+            text = message_text(chunk)
+            if text:
+                yield {"type": "token", "content": text}
+        if response is None:
+            response = AIMessageChunk(content="")
+        messages.append(response)
+
+        if not _has_tool_calls(response):
+            yield {"type": "done", "content": message_text(response)}
+            return
+
+        if iterations >= CONFIG["MAX_TOOL_ITERATIONS"]:
+            logger.warning(f"Tool loop stopped after {iterations} iterations")
+            yield {"type": "token", "content": TOOL_LIMIT_REACHED_MESSAGE}
+            yield {"type": "done", "content": TOOL_LIMIT_REACHED_MESSAGE}
+            return
+        iterations += 1
+
+        for tool_call in response.tool_calls:
+            yield {"type": "tool_start", "id": tool_call["id"], "name": tool_call["name"]}
+        tool_messages = await aexecute_tool_calls(tools, response.tool_calls, injected_args)
+        for tool_message in tool_messages:
+            yield {"type": "tool_end", "id": tool_message.tool_call_id, "name": tool_message.name}
+        messages.extend(tool_messages)
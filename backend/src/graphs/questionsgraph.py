@@ -3,6 +3,7 @@ import json
 from pydantic import BaseModel, Field
 from langgraph.graph import StateGraph, END, START
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
 from src.db import User
 from ..config import logger
 from .graph import BaseGraph
@@ -60,7 +61,10 @@ class QuestionsGraph(BaseGraph):
         try:
             self.llm = llm
             workflow = StateGraph(state_schema=AgentState)
-            workflow.add_node("supervisor", self.supervisor_agent)
+            workflow.add_node(
+                "supervisor",
+                RunnableLambda(self.supervisor_agent, afunc=self.asupervisor_agent),
+            )
             workflow.add_edge(START, "supervisor")
             workflow.add_edge("supervisor", END)
             self.graph = workflow.compile()
@@ -86,7 +90,27 @@ class QuestionsGraph(BaseGraph):
             logger.error(f"Error during graph chat: {e}")
             return []
 
-    def supervisor_agent(self, state: AgentState):
+    async def achat(self, history, base_questions, user, raise_errors=False):
+        try:
+            logger.debug(f"Invoking graph asynchronously with {len(history)} messages")
+            result = await self.graph.ainvoke(
+                {
+                    "user": user,
+                    "messages": history,
+                    "base_questions": base_questions,
+                }
+            )
+            ai_response = result["messages"][-1]
+            logger.debug("Graph invocation successful")
+            return json.loads(ai_response.content)
+        except Exception as e:
+            logger.error(f"Error during graph chat: {e}")
+            if raise_errors:
+                raise
+            return []
+
+    @staticmethod
+    def _prompt(state: AgentState) -> List[BaseMessage]:
         base_questions = state["base_questions"]
         recent_health_summary = state["user"].epa_summary
         question_prompt = f"""Base questions already asked: {base_questions}
@@ -94,12 +118,23 @@ class QuestionsGraph(BaseGraph):
 Recent health summary: {recent_health_summary}
 
 Generate up to 2 additional daily health questions if needed, different from the base ones."""
-        structured_llm = self.llm.with_structured_output(QuestionList)
-        response = structured_llm.invoke([HumanMessage(content=question_prompt)])
+        return [HumanMessage(content=question_prompt)]
 
+    @staticmethod
+    def _append_questions(state: AgentState, response: QuestionList) -> AgentState:
         state["messages"].append(
             AIMessage(
                 content=json.dumps([q.dict(by_alias=True) for q in response.questions])
             )
         )
         return state
+
+    def supervisor_agent(self, state: AgentState):
+        structured_llm = self.llm.with_structured_output(QuestionList)
+        response = structured_llm.invoke(self._prompt(state))
+        return self._append_questions(state, response)
+
+    async def asupervisor_agent(self, state: AgentState):
+        structured_llm = self.llm.with_structured_output(QuestionList)
+        response = await structured_llm.ainvoke(self._prompt(state))
+        return self._append_questions(state, response)
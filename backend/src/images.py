@@ -0,0 +1,114 @@
+"""Storage and encoding of images attached to chat messages.
+
+Uploads are downscaled and re-encoded as JPEG once, when they are stored, and
+named after the hash of their content. The base64 data URLs sent to the model
+are kept in a size-bounded LRU cache keyed by that hash, so a conversation's
+images are not read and encoded again on every turn.
+"""
+
+import base64
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+from .config import CONFIG, logger
+
+UPLOAD_DIR = "uploads"
+JPEG_QUALITY = 85
+
+
+def normalize_image(content: bytes, max_side: int = CONFIG["IMAGE_MAX_SIDE"]) -> bytes:
+    """Downscale an image so its longest side is at most `max_side` and re-encode it as JPEG."""
+    with Image.open(io.BytesIO(content)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def _store(content: bytes) -> str:
+    normalized = normalize_image(content)
+    digest = hashlib.sha256(normalized).hexdigest()
+    path = f"{UPLOAD_DIR}/{digest}.jpg"
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(normalized)
+        os.replace(tmp_path, path)
+    data_url_cache.put(digest, _to_data_url(normalized))
+    return path
+
+
+async def save_upload(content: bytes) -> str:
+    """Normalize and store an uploaded image off the event loop; returns its path."""
+    return await run_in_threadpool(_store, content)
+
+
+def _to_data_url(content: bytes) -> str:
+    return f"data:image/jpeg;base64,{base64.b64encode(content).decode('utf-8')}"
+
+
+class DataUrlCache:
+    """Thread-safe LRU cache of data URLs, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+data_url_cache = DataUrlCache(CONFIG["IMAGE_CACHE_BYTES"])
+
+
+def _cache_key(path: str) -> str:
+    # New uploads are named after their content hash; older uploads use a
+    # random name, which is just as unique since stored files never change.
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _load_data_url(path: str) -> str:
+    with open(path, "rb") as f:
+        content = f.read()
+    try:
+        content = normalize_image(content)
+    except Exception as e:
+        logger.warning(f"Could not normalize image {path}, sending it unchanged: {e}")
+    data_url = _to_data_url(content)
+    data_url_cache.put(_cache_key(path), data_url)
+    return data_url
+
+
+async def image_data_url(path: str) -> str:
+    """Data URL for a stored image, read from disk only on a cache miss."""
+    cached = data_url_cache.get(_cache_key(path))
+    if cached is not None:
+        return cached
+    return await run_in_threadpool(_load_data_url, path)
@@ -0,0 +1,81 @@
+"""Okapi BM25 over the chunks of a VectorIndex.
+
+The inverted index maps every term to the rows containing it and the term's
+frequency in each, as numpy arrays, so a query only touches the postings of
+its own terms. The index keeps one BM25Index per namespace; `search_many`
+scores several of them as one corpus, so a change to one namespace only
+rebuilds that namespace's postings.
+"""
+
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .search import Hit, top_k
+
+# Keeps numbers such as 7.2 and 1,5 together with their decimals
+TOKEN_PATTERN = re.compile(r"\w+(?:[.,]\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(texts)
+
+        postings: Dict[str, List[int]] = defaultdict(list)
+        frequencies: Dict[str, List[int]] = defaultdict(list)
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[row] = sum(counts.values())
+            for term, count in counts.items():
+                postings[term].append(row)
+                frequencies[term].append(count)
+
+        self.postings = {term: np.array(rows, dtype=np.int64) for term, rows in postings.items()}
+        self.frequencies = {term: np.array(counts, dtype=np.float32) for term, counts in frequencies.items()}
+        self.lengths = lengths
+        self.total_length = float(lengths.sum())
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> List[Hit]:
+        """Best k (row, score) pairs with a positive score."""
+        return search_many([(self, np.arange(self.size))], query, k, self.size, mask)
+
+
+def search_many(
+    parts: List[Tuple[BM25Index, np.ndarray]], query: str, k: int, size: int, mask: Optional[np.ndarray] = None
+) -> List[Hit]:
+    """Best k (row, score) pairs over several indexes scored as one corpus of `size` rows.
+
+    Each part pairs an index with the corpus row of each of its rows. Document
+    frequencies and lengths are summed over the parts, so the scores are the
+    same as those of a single index over all their texts.
+    """
+    count = sum(index.size for index, _ in parts)
+    if not count:
+        return []
+    average_length = max(sum(index.total_length for index, _ in parts) / count, 1e-6)
+
+    scores = np.zeros(size, dtype=np.float32)
+    for term in set(tokenize(query)):
+        df = sum(len(index.postings.get(term, ())) for index, _ in parts)
+        if not df:
+            continue
+        idf = float(np.log(1 + (count - df + 0.5) / (df + 0.5)))
+        for index, rows in parts:
+            local = index.postings.get(term)
+            if local is None:
+                continue
+            tf = index.frequencies[term]
+            norm = index.k1 * (1 - index.b + index.b * index.lengths[local] / average_length)
+            scores[rows[local]] += idf * tf * (index.k1 + 1) / (tf + norm)
+
+    if mask is not None:
+        scores[~mask] = 0
+    best = top_k(scores, k)
+    return [(int(row), float(scores[row])) for row in best if scores[row] > 0]
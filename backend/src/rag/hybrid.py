@@ -0,0 +1,112 @@
+"""Hybrid lexical and vector retrieval over a VectorIndex.
+
+BM25 and embedding search each propose candidates, reciprocal rank fusion
+merges the two rankings, and the fused list is re-ranked by how many of the
+query's terms each chunk contains. When BM25 alone already finds enough chunks
+containing every term of a short query, the embedding round-trip is skipped.
+Results are cached per content of the namespaces a query can see, so repeated
+queries cost a dict lookup and one user's upload does not clear the cached
+results of the others.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from ..config import CONFIG
+from .bm25 import tokenize
+from .index import IndexSnapshot, VectorIndex, normalize
+
+RRF_K = 60
+CANDIDATES = 20
+EXACT_MATCH_MAX_TERMS = 4
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = RRF_K) -> Dict[int, float]:
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank + 1)
+    return scores
+
+
+class HybridRetriever:
+    def __init__(self, index: VectorIndex, embeddings: Embeddings, cache_size: int = CONFIG["RAG_QUERY_CACHE_SIZE"]):
+        self.index = index
+        self.embeddings = embeddings
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self.lexical_only = 0
+        self.seconds = 0.0
+        # (namespace, position within the namespace) of each result
+        self._cache: OrderedDict[Tuple, List[Tuple[str, int]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _coverage(terms: set, text: str) -> float:
+        return len(terms & set(tokenize(text))) / len(terms) if terms else 0.0
+
+    def _rank(self, snapshot: IndexSnapshot, query: str, k: int, where: Optional[Dict[str, Any]]) -> List[int]:
+        terms = set(tokenize(query))
+        mask = snapshot.engine.mask(where)
+        lexical = [row for row, _ in snapshot.lexical_search(query, CANDIDATES, where, mask)]
+        coverage = {row: self._coverage(terms, snapshot.chunks[row]["text"]) for row in lexical}
+
+        exact = [row for row in lexical if coverage[row] == 1.0]
+        if len(terms) <= EXACT_MATCH_MAX_TERMS and len(exact) >= k:
+            self.lexical_only += 1
+            return exact[:k]
+
+        query_vector = normalize(self.embeddings.embed_query(query))
+        dense = [row for row, _ in snapshot.engine.search(query_vector, CANDIDATES, where)[0]]
+        fused = reciprocal_rank_fusion([lexical, dense])
+        for row in fused:
+            if row not in coverage:
+                coverage[row] = self._coverage(terms, snapshot.chunks[row]["text"])
+
+        # Full term coverage is worth as much as ranking first in one of the lists
+        return sorted(fused, key=lambda row: fused[row] + coverage[row] / (RRF_K + 1), reverse=True)[:k]
+
+    def search(self, query: str, k: int = 4, where: Optional[Dict[str, Any]] = None) -> List[Document]:
+        start = time.perf_counter()
+        snapshot = self.index.snapshot()
+        key = (
+            snapshot.content_key(where),
+            " ".join(query.split()),
+            k,
+            tuple(sorted((name, repr(value)) for name, value in (where or {}).items())),
+        )
+
+        with self._lock:
+            located = self._cache.get(key)
+            if located is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if located is not None:
+            rows = [snapshot.row(name, position) for name, position in located]
+        else:
+            rows = self._rank(snapshot, query, k, where) if snapshot.chunks else []
+            if self.cache_size > 0:
+                with self._lock:
+                    self._cache[key] = [snapshot.locate(row) for row in rows]
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+
+        self.seconds += time.perf_counter() - start
+        return [snapshot.document(row) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        queries = self.hits + self.misses
+        return {
+            "queries": queries,
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "lexical_only": self.lexical_only,
+            "average_query_ms": 1000 * self.seconds / queries if queries else 0.0,
+        }
@@ -0,0 +1,506 @@
+"""Persistent vector index of the documents used for retrieval.
+
+The index lives in a directory with two files: `vectors.npy`, one normalized
+float32 row per chunk, and `chunks.json`, the embedding model plus the text and
+metadata of every row and the content hash of the document it came from. Documents are identified
+by the SHA-256 of their file, so syncing only embeds files that are new or have
+changed and drops the rows of files that are gone. Loading memory-maps the
+vectors instead of reading them.
+
+Every chunk belongs to a namespace: the shared corpus synced from the
+configured PDFs, or a user's own uploaded documents.
+
+Several API workers can share one directory. Writers take an exclusive lock
+on `index.lock`, reload whatever another worker saved since their last read
+and write the merged result, so no worker overwrites another's documents.
+Readers reload when the files on disk change.
+
+Searches run on immutable snapshots. A snapshot is built when the index
+changes, by the writer or by the reload, never lazily by a query. It keeps
+the BM25 index of every namespace whose documents did not change and extends
+the inverted lists of approximate search with the new rows. Only the writer
+clusters the vectors again, once they have grown to RETRAIN_GROWTH times the
+number they were clustered for.
+
+When the stored vectors cannot
+be used, because the embedding model changed or the file is damaged, the text
+kept with every chunk is embedded again on the next sync instead of being
+dropped.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are coordinated
+    fcntl = None
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from ..config import CONFIG, logger
+from .bm25 import BM25Index, search_many
+from .search import Hit, SearchEngine
+
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.json"
+LOCK_FILE = "index.lock"
+SHARED_NAMESPACE = "shared"
+RETRAIN_GROWTH = 2
+
+text_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=500,
+    chunk_overlap=100,
+    add_start_index=True,
+)
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_pdf_chunks(path: str) -> List[Document]:
+    docs = PyPDFLoader(path).load()
+    logger.info(f"Loaded {len(docs)} documents from {path}")
+    return text_splitter.split_documents(docs)
+
+
+def user_namespace(username: str) -> str:
+    return f"user:{username}"
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class NamespaceIndex:
+    """The rows of one namespace in a snapshot, the documents they come from and BM25 over their text.
+
+    `key` identifies the namespace's content; it is kept while its documents stay the same.
+    """
+
+    _keys = itertools.count()
+
+    def __init__(self, rows: np.ndarray, documents: Tuple[str, ...], lexical: BM25Index, key: Optional[int] = None):
+        self.rows = rows
+        self.documents = documents
+        self.lexical = lexical
+        self.key = next(self._keys) if key is None else key
+
+
+class IndexSnapshot:
+    """One version of the index: its chunks, their search engine and BM25 per namespace."""
+
+    def __init__(
+        self, version: int, chunks: List[Dict[str, Any]], engine: SearchEngine, namespaces: Dict[str, NamespaceIndex]
+    ):
+        self.version = version
+        self.chunks = chunks
+        self.engine = engine
+        self.namespaces = namespaces
+
+    def selected(self, where: Optional[Dict[str, Any]]) -> List[str]:
+        """The namespaces a search with `where` can return rows from."""
+        value = (where or {}).get("namespace")
+        if value is None:
+            return sorted(self.namespaces)
+        names = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        return sorted(name for name in set(names) if name in self.namespaces)
+
+    def lexical_search(
+        self, query: str, k: int, where: Optional[Dict[str, Any]] = None, mask: Optional[np.ndarray] = None
+    ) -> List[Hit]:
+        """BM25 over the namespaces selected by `where`, scored as one corpus."""
+        parts = [(self.namespaces[name].lexical, self.namespaces[name].rows) for name in self.selected(where)]
+        return search_many(parts, query, k, len(self.chunks), mask)
+
+    def content_key(self, where: Optional[Dict[str, Any]]) -> Tuple:
+        """Changes only when the results of a search with `where` may have changed."""
+        ivf = self.engine.ivf
+        return (
+            ivf.key if ivf is not None else None,
+            tuple((name, self.namespaces[name].key) for name in self.selected(where)),
+        )
+
+    def locate(self, row: int) -> Tuple[str, int]:
+        """(namespace, position within the namespace) of a row; stable while the namespace is unchanged."""
+        name = self.chunks[row].get("namespace", SHARED_NAMESPACE)
+        return name, int(np.searchsorted(self.namespaces[name].rows, row))
+
+    def row(self, name: str, position: int) -> int:
+        return int(self.namespaces[name].rows[position])
+
+    def document(self, row: int) -> Document:
+        chunk = self.chunks[row]
+        return Document(page_content=chunk["text"], metadata=chunk["metadata"])
+
+
+def build_snapshot(
+    version: int,
+    chunks: List[Dict[str, Any]],
+    vectors: np.ndarray,
+    previous: Optional[IndexSnapshot] = None,
+    start: int = 0,
+    retrain: bool = True,
+) -> IndexSnapshot:
+    """Snapshot of `chunks`, whose first `start` rows are the same as in `previous`.
+
+    Namespaces whose documents did not change keep their BM25 index. With
+    approximate search, rows from `start` on join the inverted lists of
+    `previous`; the vectors are clustered again only if `retrain` is set and
+    they have grown RETRAIN_GROWTH times, or if the lists cannot be reused.
+    """
+    start = start if previous is not None else 0
+    grouped: Dict[str, Tuple[List[np.ndarray], List[str]]] = {}
+    if start:
+        for name, namespace in previous.namespaces.items():
+            rows = namespace.rows[namespace.rows < start]
+            if len(rows) == len(namespace.rows):
+                grouped[name] = ([rows], list(namespace.documents))
+            elif len(rows):
+                grouped[name] = ([rows], list(dict.fromkeys(chunks[row]["document"] for row in rows)))
+    new_rows: Dict[str, List[int]] = {}
+    for row in range(start, len(chunks)):
+        chunk = chunks[row]
+        name = chunk.get("namespace", SHARED_NAMESPACE)
+        new_rows.setdefault(name, []).append(row)
+        blocks, documents = grouped.setdefault(name, ([], []))
+        if not documents or documents[-1] != chunk["document"]:
+            documents.append(chunk["document"])
+    for name, rows in new_rows.items():
+        grouped[name][0].append(np.array(rows, dtype=np.int64))
+
+    namespaces: Dict[str, NamespaceIndex] = {}
+    for name, (blocks, documents) in grouped.items():
+        rows = np.concatenate(blocks)
+        documents = tuple(documents)
+        kept = previous.namespaces.get(name) if previous is not None else None
+        if kept is not None and kept.documents == documents:
+            namespaces[name] = NamespaceIndex(rows, documents, kept.lexical, kept.key)
+        else:
+            namespaces[name] = NamespaceIndex(rows, documents, BM25Index([chunks[row]["text"] for row in rows]))
+
+    metadata = previous.engine.metadata[:start] if start else []
+    metadata = metadata + [
+        {**chunk["metadata"], "namespace": chunk.get("namespace", SHARED_NAMESPACE)} for chunk in chunks[start:]
+    ]
+
+    ivf = None
+    approximate = CONFIG["RAG_APPROXIMATE_SEARCH"]
+    if approximate and len(vectors) and previous is not None and previous.engine.ivf is not None:
+        ivf = previous.engine.ivf
+        reusable = vectors.shape[1] == ivf.centroids.shape[1]
+        if reusable and not (retrain and len(vectors) >= RETRAIN_GROWTH * ivf.trained):
+            ivf = ivf.extended(vectors, start)
+        else:
+            ivf = None
+
+    engine = SearchEngine(
+        vectors,
+        metadata,
+        approximate=approximate,
+        lists=CONFIG["RAG_SEARCH_LISTS"],
+        probes=CONFIG["RAG_SEARCH_PROBES"],
+        ivf=ivf,
+    )
+    return IndexSnapshot(version, chunks, engine, namespaces)
+
+
+class VectorIndex:
+    """Chunks and their normalized embeddings, persisted in `directory`."""
+
+    def __init__(self, directory: str, model_id: str = ""):
+        self.directory = directory
+        self.model_id = model_id
+        self.chunks: List[Dict[str, Any]] = []
+        self.vectors: Optional[np.ndarray] = None
+        # Stored chunks whose vectors have to be computed again
+        self.stale: List[Dict[str, Any]] = []
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._version = 0
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._write_lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.load()
+
+    def document_hashes(self, namespace: str) -> set:
+        return {
+            chunk["document"]
+            for chunk in self.chunks + self.stale
+            if chunk.get("namespace", SHARED_NAMESPACE) == namespace
+        }
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _disk_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self._path(CHUNKS_FILE))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        """Hold the directory lock, shared for reading or exclusive for a read-merge-write cycle."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _updating(self):
+        """Serialize writers within this process and across processes."""
+        with self._update_lock, self._locked(exclusive=True):
+            self.refresh(locked=True)
+            yield
+
+    def load(self, locked: bool = False):
+        if not locked:
+            with self._locked(exclusive=False):
+                return self.load(locked=True)
+
+        stamp = self._disk_stamp()
+        if stamp is None:
+            return
+
+        try:
+            with open(self._path(CHUNKS_FILE), "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            chunks = stored["chunks"]
+        except Exception as e:
+            logger.error(f"Could not read the chunks of the vector index in {self.directory}: {e}")
+            return
+
+        vectors = None
+        stale = []
+        if stored.get("model") != self.model_id:
+            logger.info(f"Vector index in {self.directory} was built with another embedding model, its chunks will be embedded again")
+            stale = chunks
+        else:
+            try:
+                vectors = np.load(self._path(VECTORS_FILE), mmap_mode="r")
+            except Exception as e:
+                logger.error(f"Could not load the vectors in {self.directory}, the chunks will be embedded again: {e}")
+            if vectors is None or len(vectors) != len(chunks):
+                vectors = None
+                stale = chunks
+
+        current = [] if stale else chunks
+        self._swap(current, vectors, stale, stamp, start=self._unchanged_rows(current), retrain=False)
+        logger.info(f"Loaded vector index with {len(chunks)} chunks from {self.directory}")
+
+    def refresh(self, locked: bool = False):
+        """Reload the index if another worker saved a newer version."""
+        if self._disk_stamp() != self._stamp:
+            self.load(locked=locked)
+
+    def _replace(self, chunks: List[Dict[str, Any]], blocks: List[np.ndarray], start: int = 0):
+        """Persist new rows, then swap them in; callers hold the directory lock.
+
+        The first `start` rows are unchanged from the current version.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        vectors_path = self._path(VECTORS_FILE)
+        chunks_path = self._path(CHUNKS_FILE)
+
+        with open(f"{vectors_path}.tmp", "wb") as f:
+            np.save(f, np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype=np.float32))
+        with open(f"{chunks_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_id, "chunks": chunks}, f)
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        os.replace(f"{chunks_path}.tmp", chunks_path)
+
+        vectors = np.load(vectors_path, mmap_mode="r")
+        self._swap(chunks, vectors, [], self._disk_stamp(), start=start, retrain=True)
+
+    def _unchanged_rows(self, chunks: List[Dict[str, Any]]) -> int:
+        """How many leading rows of `chunks` come from the same documents as in the current snapshot."""
+        previous = self._snapshot.chunks if self._snapshot is not None else []
+        for row, (before, after) in enumerate(zip(previous, chunks)):
+            # Rows of the same document are its chunks in the same order
+            if before is not after and (
+                before.get("namespace", SHARED_NAMESPACE) != after.get("namespace", SHARED_NAMESPACE)
+                or before["document"] != after["document"]
+            ):
+                return row
+        return min(len(previous), len(chunks))
+
+    def _swap(
+        self,
+        chunks: List[Dict[str, Any]],
+        vectors: Optional[np.ndarray],
+        stale: List[Dict[str, Any]],
+        stamp: Optional[Tuple[int, int, int]],
+        start: int,
+        retrain: bool,
+    ):
+        """Build the snapshot of a new version outside the write lock, then publish it."""
+        snapshot = build_snapshot(
+            self._version + 1,
+            chunks,
+            vectors if vectors is not None else np.zeros((0, 0), dtype=np.float32),
+            self._snapshot,
+            start,
+            retrain,
+        )
+        with self._write_lock:
+            self.chunks = chunks
+            self.vectors = vectors
+            self.stale = stale
+            self._stamp = stamp
+            self._version = snapshot.version
+            self._snapshot = snapshot
+
+    def _current_blocks(self) -> List[np.ndarray]:
+        return [np.asarray(self.vectors)] if self.vectors is not None and len(self.chunks) else []
+
+    def add_documents(self, documents: List[Tuple[str, str, List[Document], List[List[float]]]]) -> int:
+        """Append (namespace, content hash, chunks, embeddings) documents; returns the rows added.
+
+        Documents already indexed in their namespace are skipped. Searches keep
+        using the previous rows until the new ones are saved. Fails while stored
+        chunks still wait for sync to embed them again.
+        """
+        with self._updating():
+            if self.stale:
+                raise RuntimeError("Vector index is waiting to be embedded again, sync it first")
+            indexed = {(chunk.get("namespace", SHARED_NAMESPACE), chunk["document"]) for chunk in self.chunks}
+            chunks = list(self.chunks)
+            blocks = self._current_blocks()
+            added = 0
+            for namespace, digest, splits, vectors in documents:
+                if (namespace, digest) in indexed or not splits:
+                    continue
+                indexed.add((namespace, digest))
+                blocks.append(normalize(vectors))
+                chunks.extend(
+                    {"namespace": namespace, "document": digest, "text": split.page_content, "metadata": split.metadata}
+                    for split in splits
+                )
+                added += len(splits)
+            if added:
+                self._replace(chunks, blocks, start=len(self.chunks))
+            return added
+
+    def sync(self, paths: List[str], embeddings: Embeddings) -> bool:
+        """Bring the shared corpus in line with the PDFs in `paths`; returns whether it changed.
+
+        Chunks whose vectors could not be loaded are embedded again first, so
+        user documents survive a change of embedding model.
+        """
+        current: Dict[str, str] = {}
+        for path in paths:
+            if not os.path.exists(path):
+                logger.error(f"PDF not found: {path}")
+                continue
+            current.setdefault(file_hash(path), path)
+
+        with self._updating():
+            indexed = self.document_hashes(SHARED_NAMESPACE)
+            removed = indexed - current.keys()
+            added = {digest: path for digest, path in current.items() if digest not in indexed}
+            if not removed and not added and not self.stale:
+                logger.info(f"Vector index is up to date ({len(self.chunks)} chunks)")
+                return False
+
+            chunks = list(self.chunks)
+            blocks = self._current_blocks()
+            if self.stale:
+                chunks = list(self.stale)
+                blocks = [normalize(embeddings.embed_documents([chunk["text"] for chunk in chunks]))] if chunks else []
+                logger.info(f"Embedded {len(chunks)} stored chunks again")
+
+            keep = [
+                i
+                for i, chunk in enumerate(chunks)
+                if chunk.get("namespace", SHARED_NAMESPACE) != SHARED_NAMESPACE or chunk["document"] not in removed
+            ]
+            if len(keep) < len(chunks):
+                vectors = np.concatenate(blocks) if blocks else None
+                chunks = [chunks[i] for i in keep]
+                blocks = [vectors[keep]] if vectors is not None and keep else []
+
+            for digest, path in added.items():
+                try:
+                    splits = load_pdf_chunks(path)
+                    if not splits:
+                        continue
+                    vectors = embeddings.embed_documents([split.page_content for split in splits])
+                except Exception as e:
+                    logger.error(f"Failed to index PDF {path}: {e}")
+                    continue
+                blocks.append(normalize(vectors))
+                chunks.extend(
+                    {"namespace": SHARED_NAMESPACE, "document": digest, "text": split.page_content, "metadata": split.metadata}
+                    for split in splits
+                )
+                logger.info(f"Indexed {len(splits)} chunks from {path}")
+
+            self._replace(chunks, blocks)
+        logger.info(f"Vector index now holds {len(chunks)} chunks, {len(removed)} documents removed")
+        return True
+
+    def snapshot(self) -> "IndexSnapshot":
+        """The current version of the index; it stays consistent while the index changes."""
+        self.refresh()
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._write_lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    snapshot = self._snapshot = build_snapshot(self._version, [], np.zeros((0, 0), dtype=np.float32))
+        return snapshot
+
+    @property
+    def engine(self) -> SearchEngine:
+        return self.snapshot().engine
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chunks": len(self.chunks),
+            "queries": self.queries,
+            "average_query_ms": 1000 * self.query_seconds / self.queries if self.queries else 0.0,
+        }
+
+    def similarity_search(
+        self, query_vector: List[float], k: int = 4, where: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        return self.similarity_search_batch([query_vector], k, where)[0]
+
+    def similarity_search_batch(
+        self, query_vectors: List[List[float]], k: int = 4, where: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        """Top-k documents for each query; `where` restricts the search to matching metadata."""
+        start = time.perf_counter()
+        snapshot = self.snapshot()
+        hits = snapshot.engine.search(normalize(query_vectors), k, where)
+        self.queries += len(hits)
+        self.query_seconds += time.perf_counter() - start
+        return [[snapshot.document(row) for row, _ in query_hits] for query_hits in hits]
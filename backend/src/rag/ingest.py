@@ -0,0 +1,134 @@
+"""Background ingestion of user documents into the vector index.
+
+Uploaded PDFs and ePA files are queued and processed by a single worker
+thread: pages are parsed one at a time, split into chunks and embedded in
+batches, and the finished document is added to the uploader's namespace of the
+index. Request handlers only pay for queueing the upload.
+"""
+
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Literal, Optional
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.document_loaders import PyPDFLoader
+from pydantic import BaseModel
+from ..config import logger
+from .index import VectorIndex, text_splitter, user_namespace
+
+EMBED_BATCH = 64
+MAX_TRACKED_JOBS = 1000
+
+
+class IngestionJob(BaseModel):
+    id: str
+    username: str
+    filename: str
+    status: Literal["queued", "running", "done", "failed"] = "queued"
+    chunks: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+def iter_pages(filename: str, content: bytes) -> Iterator[Document]:
+    """Pages of a PDF, or the whole file as one text document for anything else."""
+    if not content.startswith(b"%PDF"):
+        yield Document(page_content=content.decode("utf-8", errors="replace"), metadata={"source": filename})
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(content)
+        path = f.name
+    try:
+        for page in PyPDFLoader(path).lazy_load():
+            page.metadata["source"] = filename
+            yield page
+    finally:
+        os.remove(path)
+
+
+class IngestionWorker:
+    def __init__(self, index: VectorIndex, embeddings: Embeddings):
+        self.index = index
+        self.embeddings = embeddings
+        self.jobs: OrderedDict[str, IngestionJob] = OrderedDict()
+        self.documents = 0
+        self.chunks = 0
+        self.seconds = 0.0
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, username: str, filename: str, content: bytes) -> IngestionJob:
+        job = IngestionJob(id=str(uuid.uuid4()), username=username, filename=filename)
+        with self._lock:
+            self.jobs[job.id] = job
+            while len(self.jobs) > MAX_TRACKED_JOBS:
+                self.jobs.popitem(last=False)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ingest", daemon=True)
+                self._thread.start()
+        self._queue.put((job, content))
+        logger.info(f"Queued {filename} of user {username} for ingestion as job {job.id}")
+        return job
+
+    def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def _run(self):
+        while True:
+            job, content = self._queue.get()
+            try:
+                self._ingest(job, content)
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                logger.error(f"Ingestion job {job.id} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _ingest(self, job: IngestionJob, content: bytes):
+        job.status = "running"
+        start = time.perf_counter()
+        digest = hashlib.sha256(content).hexdigest()
+
+        splits: List[Document] = []
+        vectors: List[List[float]] = []
+        pending: List[Document] = []
+        for page in iter_pages(job.filename, content):
+            pending.extend(text_splitter.split_documents([page]))
+            if len(pending) >= EMBED_BATCH:
+                vectors.extend(self.embeddings.embed_documents([split.page_content for split in pending]))
+                splits.extend(pending)
+                pending = []
+        if pending:
+            vectors.extend(self.embeddings.embed_documents([split.page_content for split in pending]))
+            splits.extend(pending)
+
+        added = self.index.add_documents([(user_namespace(job.username), digest, splits, vectors)])
+
+        job.chunks = added
+        job.seconds = time.perf_counter() - start
+        job.status = "done"
+        with self._lock:
+            self.documents += 1
+            self.chunks += added
+            self.seconds += job.seconds
+        logger.info(
+            f"Ingested {job.filename} of user {job.username}: {added} chunks in {job.seconds:.2f}s"
+        )
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "documents": self.documents,
+                "chunks": self.chunks,
+                "chunks_per_second": self.chunks / self.seconds if self.seconds else 0.0,
+            }
@@ -0,0 +1,176 @@
+"""Top-k similarity search over the rows of a VectorIndex.
+
+Scores are dot products of normalized vectors, computed for a whole batch of
+queries with one matrix product, and the best k are picked with argpartition
+instead of a full sort. Candidates can be pre-filtered on chunk metadata. For
+large corpora an approximate mode (an IVF index) clusters the vectors once and
+only scores the rows in the clusters closest to the query. Rows added later
+are assigned to the existing clusters instead of clustering again.
+"""
+
+import itertools
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from ..config import logger
+
+Hit = Tuple[int, float]
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores of each row, best first."""
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.zeros(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < scores.shape[-1]:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[-1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+class InvertedLists:
+    """IVF clustering of a set of vectors: spherical k-means centroids and the rows of each list.
+
+    New rows can be added to the nearest existing list without clustering
+    again; `key` only changes when the centroids do.
+    """
+
+    _keys = itertools.count()
+
+    def __init__(self, centroids: np.ndarray, lists: List[np.ndarray], trained: int, key: Optional[int] = None):
+        self.centroids = centroids
+        self.lists = lists
+        # Number of vectors the centroids were trained for
+        self.trained = trained
+        self.key = next(self._keys) if key is None else key
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, lists: int, seed: int = 0, iterations: int = 10) -> "InvertedLists":
+        """Cluster the vectors with spherical k-means into `lists` inverted lists."""
+        rng = np.random.default_rng(seed)
+        lists = max(1, min(lists, len(vectors)))
+        sample_size = min(len(vectors), lists * 64)
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Keep the previous centroid for clusters that lost all their members
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+        logger.info(f"Built {lists} inverted lists for {len(vectors)} vectors")
+        return cls(centroids, cls._group(centroids, vectors, 0), len(vectors))
+
+    @staticmethod
+    def _group(centroids: np.ndarray, vectors: np.ndarray, start: int) -> List[np.ndarray]:
+        """Rows from `start` on, grouped by their nearest centroid."""
+        assignment = np.concatenate([
+            np.argmax(np.asarray(vectors[offset:offset + 65536]) @ centroids.T, axis=1)
+            for offset in range(start, len(vectors), 65536)
+        ] or [np.zeros(0, dtype=np.int64)])
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+        return [start + order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+
+    def extended(self, vectors: np.ndarray, start: int) -> "InvertedLists":
+        """Lists over `vectors` whose first `start` rows are unchanged; later rows join their nearest list."""
+        added = self._group(self.centroids, vectors, start)
+        lists = [np.concatenate([rows[rows < start], new]) for rows, new in zip(self.lists, added)]
+        return InvertedLists(self.centroids, lists, self.trained, self.key)
+
+
+class SearchEngine:
+    """Exact or approximate top-k search over normalized float32 vectors.
+
+    In approximate mode the engine clusters the vectors itself unless it is
+    given the inverted lists of a previous engine, extended to its vectors.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        metadata: List[Dict[str, Any]],
+        approximate: bool = False,
+        lists: int = 0,
+        probes: int = 8,
+        seed: int = 0,
+        ivf: Optional[InvertedLists] = None,
+    ):
+        self.vectors = vectors
+        self.metadata = metadata
+        self.approximate = approximate and len(vectors) > 0
+        self.probes = probes
+        self._columns: Dict[str, np.ndarray] = {}
+        self.ivf = None
+        if self.approximate:
+            self.ivf = ivf if ivf is not None else InvertedLists.train(vectors, lists or int(np.sqrt(len(vectors))), seed)
+
+    def _column(self, key: str) -> np.ndarray:
+        column = self._columns.get(key)
+        if column is None:
+            column = np.array([meta.get(key) for meta in self.metadata], dtype=object)
+            self._columns[key] = column
+        return column
+
+    def mask(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Rows whose metadata has all `where` values; a list value matches any of its items."""
+        if not where:
+            return None
+        mask = np.ones(len(self.metadata), dtype=bool)
+        for key, value in where.items():
+            column = self._column(key)
+            if isinstance(value, (list, tuple, set)):
+                mask &= np.isin(column, list(value))
+            else:
+                mask &= column == value
+        return mask
+
+    def _candidates(self, query: np.ndarray, mask: Optional[np.ndarray], k: int) -> Optional[np.ndarray]:
+        """Rows in the lists closest to the query, or None to search all rows."""
+        nearest = top_k(self.ivf.centroids @ query, self.probes)
+        candidates = np.concatenate([self.ivf.lists[i] for i in nearest])
+        if mask is not None:
+            candidates = candidates[mask[candidates]]
+        # Too few neighbours to fill k results, fall back to an exact search
+        return candidates if len(candidates) >= k else None
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 4,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Hit]]:
+        """Best k (row, score) pairs for each normalized query vector in `queries`."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if len(self.vectors) == 0 or k <= 0:
+            return [[] for _ in queries]
+
+        mask = self.mask(where)
+        rows = None if mask is None else np.flatnonzero(mask)
+        if rows is not None and len(rows) == 0:
+            return [[] for _ in queries]
+
+        if self.approximate:
+            return [self._search_one(query, k, mask, rows) for query in queries]
+
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        scores = queries @ vectors.T
+        best = top_k(scores, k)
+        results = []
+        for query_scores, query_best in zip(scores, best):
+            ids = query_best if rows is None else rows[query_best]
+            results.append(list(zip(ids.tolist(), query_scores[query_best].tolist())))
+        return results
+
+    def _search_one(
+        self, query: np.ndarray, k: int, mask: Optional[np.ndarray], rows: Optional[np.ndarray]
+    ) -> List[Hit]:
+        candidates = self._candidates(query, mask, k)
+        if candidates is None:
+            candidates = rows if rows is not None else np.arange(len(self.vectors))
+        scores = self.vectors[candidates] @ query
+        best = top_k(scores, k)
+        return list(zip(candidates[best].tolist(), scores[best].tolist()))
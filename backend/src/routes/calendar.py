@@ -3,14 +3,13 @@ from fastapi import APIRouter, HTTPException, Depends
 from ..config import logger
 from http import HTTPStatus
 from datetime import datetime
-from src.db import (
-    Event,
+from src.db import Event, User
+from src.async_db import (
     get_user_events,
     add_event as db_add_event,
     remove_event as db_remove_event,
     edit_event as db_edit_event,
     get_user_events_between_timestamps,
-    User,
 )
 from ..utils import get_current_user
 
@@ -42,7 +41,7 @@ router = APIRouter(prefix="/calendar", tags=["calendar"])
 @router.get("/")
 async def get_calendar(user: User = Depends(get_current_user)):
     logger.debug(f"Getting calendar for user: {user.username}")
-    events = get_user_events(user.username)
+    events = await get_user_events(user.username)
 
     logger.info(f"Retrieved {len(events)} events for user: {user.username}")
     return CalendarDTO(events=events)
@@ -53,7 +52,7 @@ async def get_events_between_timestamps(from_timestamp: str, to_timestamp: str,
     logger.debug(f"Getting events between {from_timestamp} and {to_timestamp} for user: {user.username}")
     start = datetime.fromisoformat(from_timestamp)
     end = datetime.fromisoformat(to_timestamp)
-    filtered_events = get_user_events_between_timestamps(user.username, start, end)
+    filtered_events = await get_user_events_between_timestamps(user.username, start, end)
 
     logger.info(f"Retrieved {len(filtered_events)} events between timestamps for user: {user.username}")
     return CalendarDTO(events=filtered_events)
@@ -64,7 +63,7 @@ async def add_event(data: AddEventDTO, user: User = Depends(get_current_user)):
     logger.debug(f"Adding event for user: {user.username}")
     from_ts = datetime.fromisoformat(data["from_timestamp"])
     to_ts = datetime.fromisoformat(data["to_timestamp"])
-    event = db_add_event(user.username, data["description"], from_ts, to_ts)
+    event = await db_add_event(user.username, data["description"], from_ts, to_ts)
 
     logger.info(f"Added event {event.id} for user: {user.username}")
     return {"message": "Event added", "event_id": event.id}
@@ -73,7 +72,7 @@ async def add_event(data: AddEventDTO, user: User = Depends(get_current_user)):
 @router.post("/remove")
 async def remove_event(data: RemoveEventDTO, user: User = Depends(get_current_user)):
     logger.debug(f"Removing event {data['event_id']} for user: {user.username}")
-    success = db_remove_event(user.username, data["event_id"])
+    success = await db_remove_event(user.username, data["event_id"])
 
     if not success:
         logger.warning(f"User or event not found: user {user.username}, event {data['event_id']}")
@@ -87,7 +86,7 @@ async def edit_event(data: EditEventDTO, user: User = Depends(get_current_user))
     logger.debug(f"Editing event {data['event_id']} for user: {user.username}")
     from_ts = datetime.fromisoformat(data["from_timestamp"])
     to_ts = datetime.fromisoformat(data["to_timestamp"])
-    success = db_edit_event(user.username, data["event_id"], data["description"], from_ts, to_ts)
+    success = await db_edit_event(user.username, data["event_id"], data["description"], from_ts, to_ts)
 
     if not success:
         logger.warning(f"User or event not found: user {user.username}, event {data['event_id']}")
@@ -1,52 +1,68 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from http import HTTPStatus
-from typing import List
-from datetime import datetime
+from typing import List, Optional
 from pydantic import BaseModel
-from ..db import get_user_conversations, get_conversation, Conversation, User
+import base64
+from ..db import Conversation, ConversationSummary, User
+from ..async_db import get_user_conversation_summaries, get_conversation
 from ..config import logger
 from ..utils import get_current_user
 
 
-class ConversationSummary(BaseModel):
-    id: str
-    title: str | None
-    date: datetime
+class ConversationPage(BaseModel):
+    conversations: List[ConversationSummary]
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(summary: ConversationSummary) -> str:
+    last_timestamp = "" if summary.message_count == 0 else summary.date.isoformat()
+    raw = f"{last_timestamp}|{summary.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        last_timestamp, conversation_id = raw.split("|", 1)
+    except Exception:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Invalid cursor")
+    return last_timestamp, conversation_id
 
 
 router = APIRouter(prefix="/conversations", tags=["conversations"])
 
 
 @router.get("/")
-async def get_conversations(user: User = Depends(get_current_user)) -> List[ConversationSummary]:
+async def get_conversations(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    user: User = Depends(get_current_user),
+) -> ConversationPage:
     logger.debug("get_conversations")
 
-    conversations_dict = get_user_conversations(user.username)
-    conversations = list(conversations_dict.values())
+    before = decode_cursor(cursor) if cursor else None
+    # Fetch one extra row to know whether another page exists
+    summaries = await get_user_conversation_summaries(user.username, limit + 1, before)
 
-    # Sort by the timestamp of the last message in each conversation
-    conversations.sort(
-        key=lambda conv: conv.messages[-1].timestamp if conv.messages else datetime.min,
-        reverse=True
-    )
+    next_cursor = None
+    if len(summaries) > limit:
+        summaries = summaries[:limit]
+        next_cursor = encode_cursor(summaries[-1])
 
-    # Return only id, title, and date
-    return [
-        ConversationSummary(
-            id=conv.id,
-            title=conv.title,
-            date=conv.messages[-1].timestamp if conv.messages else datetime.min
-        )
-        for conv in conversations
-    ]
+    return ConversationPage(conversations=summaries, next_cursor=next_cursor)
 
 
 @router.get("/{conversation_id}")
-async def get_conversation_by_id(conversation_id: str, user: User = Depends(get_current_user)) -> Conversation:
+async def get_conversation_by_id(
+    conversation_id: str,
+    since: Optional[int] = Query(None, ge=0),
+    user: User = Depends(get_current_user),
+) -> Conversation:
+    """Return a conversation; pass the last seen message id as `since` to get only newer messages."""
     logger.debug(f"get_conversation_by_id: {conversation_id}")
 
-    conversation = get_conversation(user.username, conversation_id)
+    conversation = await get_conversation(user.username, conversation_id, since)
     if conversation is None:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Conversation not found")
 
-    return conversation
\ No newline at end of file
+    return conversation
@@ -2,12 +2,12 @@ from http import HTTPStatus
 from typing import List, Literal, Optional, TypedDict
 from fastapi import APIRouter, HTTPException, Depends
 
-from src.db import (
-    Answer,
+from src.db import Answer, User
+from src.async_db import (
     save_daily_answers,
     get_daily_questions as get_stored_daily_questions,
     save_daily_questions,
-    User,
+    run_in_db_executor,
 )
 from ..state import questions_graph
 from ..utils import get_recent_messages, get_current_user
@@ -30,11 +30,11 @@ class DailyQuestion(TypedDict):
 
 
 @router.get("/")
-def get_daily_questions(user: User = Depends(get_current_user)):
+async def get_daily_questions(user: User = Depends(get_current_user)):
     logger.info(f"Daily questions requested for user: {user.username}")
 
     # Try to get pre-generated questions first
-    pre_generated = get_stored_daily_questions(user.username)
+    pre_generated = await get_stored_daily_questions(user.username)
     if pre_generated:
         return pre_generated
 
@@ -79,12 +79,12 @@ def get_daily_questions(user: User = Depends(get_current_user)):
         ),
     ]
 
-    recent_messages = get_recent_messages(user.username)
+    recent_messages = await run_in_db_executor(get_recent_messages, user.username)
 
-    additional_questions = questions_graph.chat(recent_messages, base_questions, user)
+    additional_questions = await questions_graph.achat(recent_messages, base_questions, user)
     additional_questions = additional_questions[:2]
     all_questions = base_questions + additional_questions
-    save_daily_questions(user.username, all_questions)
+    await save_daily_questions(user.username, all_questions)
     return all_questions
 
 
@@ -95,7 +95,7 @@ class AnswerDTO(TypedDict):
 
 
 @router.post("/")
-def submit_daily_answers(data: List[AnswerDTO], user: User = Depends(get_current_user)):
+async def submit_daily_answers(data: List[AnswerDTO], user: User = Depends(get_current_user)):
     if not user.needs_daily_questions:
         raise HTTPException(
             status_code=HTTPStatus.CONFLICT,
@@ -109,6 +109,6 @@ def submit_daily_answers(data: List[AnswerDTO], user: User = Depends(get_current
         for answer in data
     ]
 
-    save_daily_answers(user.username, answers)
+    await save_daily_answers(user.username, answers)
     logger.info(f"Received daily answers for user {user.username}: {answers}")
     return {"status": "success"}
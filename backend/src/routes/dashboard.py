@@ -1,22 +1,50 @@
-from fastapi import APIRouter, Depends
-from src.clients.llm import LLM
+from datetime import datetime, timedelta
+from typing import List, Literal
+from fastapi import APIRouter, Depends, Query
 from src.graphs.dashboardgraph import DashboardGraph
-from src.db import get_daily_dashboard_widgets, save_daily_dashboard_widgets, User
+from src.state import get_dashboard_graph
+from src.db import SeriesPoint, User, UserAggregates
+from src.async_db import (
+    get_answer_series,
+    get_user_aggregates,
+    get_daily_dashboard_widgets,
+    get_user_events,
+    save_daily_dashboard_widgets,
+)
 from ..utils import get_current_user
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
 
 @router.get("/widgets")
-async def get_widgets(user: User = Depends(get_current_user)):
+async def get_widgets(
+    user: User = Depends(get_current_user),
+    graph: DashboardGraph = Depends(get_dashboard_graph),
+):
     # Try to get pre-generated widgets first
-    pre_generated = get_daily_dashboard_widgets(user.username)
+    pre_generated = await get_daily_dashboard_widgets(user.username)
     if pre_generated:
         return pre_generated
 
     # Fallback: generate on-the-fly
-    llm = LLM()
-    graph = DashboardGraph(llm.llm)
-    widgets = graph.run(user.__dict__)
-    save_daily_dashboard_widgets(user.username, [widget.__dict__ for widget in widgets])
+    user.events = await get_user_events(user.username) or []
+    widgets = await graph.arun(user.__dict__)
+    await save_daily_dashboard_widgets(user.username, [widget.__dict__ for widget in widgets])
     return widgets
+
+
+@router.get("/series/{field}")
+async def get_series(
+    field: str,
+    bucket: Literal["day", "week", "month"] = "day",
+    days: int = Query(90, ge=1, le=3660),
+    user: User = Depends(get_current_user),
+) -> List[SeriesPoint]:
+    """Daily answers of one field, such as weight or mood, averaged per bucket over the last `days`."""
+    since = datetime.now().date() - timedelta(days=days)
+    return await get_answer_series(user.username, field, since, bucket=bucket)
+
+
+@router.get("/aggregates")
+async def get_aggregates(user: User = Depends(get_current_user)) -> UserAggregates:
+    return await get_user_aggregates(user.username)
@@ -3,7 +3,8 @@ from ..state import diet_graph
 from ..utils import get_recent_messages, get_current_user
 from ..config import logger
 from typing import Dict, Any, Optional, TypedDict
-from src.db import get_daily_answers, User
+from src.db import User
+from src.async_db import get_latest_daily_answers, run_in_db_executor
 
 
 class DietPlanDTO(TypedDict):
@@ -16,16 +17,16 @@ router = APIRouter(prefix="/diet", tags=["diet"])
 
 
 @router.post("/plan")
-def plan_diet(data: DietPlanDTO, user: User = Depends(get_current_user)):
+async def plan_diet(data: DietPlanDTO, user: User = Depends(get_current_user)):
     days = data["days"]
     start_date = data.get("start_date")
     preferences = data.get("preferences")
     logger.info(f"Diet planning requested for user: {user.username}, days: {days}, start_date: {start_date}")
 
     registration_answers = user.__dict__
-    daily_answers_history = get_daily_answers(user.username)
-    latest_answers = daily_answers_history[-1].answers if daily_answers_history else []
-    recent_messages = get_recent_messages(user.username)
+    latest = await get_latest_daily_answers(user.username)
+    latest_answers = latest.answers if latest else []
+    recent_messages = await run_in_db_executor(get_recent_messages, user.username)
 
     diet_prompt = f"Plan a {days}-day diet starting from {start_date} based on the user's health information and preferences: {preferences or {}}. Ensure you create meals for ALL {days} days."
 
@@ -34,6 +35,8 @@ def plan_diet(data: DietPlanDTO, user: User = Depends(get_current_user)):
     messages = recent_messages + [HumanMessage(content=diet_prompt)]
 
     diet_plan_state = {"days": days, "start_date": start_date}
-    diet_plan = diet_graph.chat(messages, latest_answers, registration_answers, diet_plan_state)
+    diet_plan = await diet_graph.achat(
+        messages, latest_answers, registration_answers, diet_plan_state, username=user.username
+    )
 
     return {"diet_plan": diet_plan}
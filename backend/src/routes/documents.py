@@ -1,19 +1,27 @@
-from fastapi import APIRouter, File, UploadFile, Depends
+from fastapi import APIRouter, File, HTTPException, UploadFile, Depends
+from http import HTTPStatus
 from ..config import logger
-from ..utils import get_current_user
+from ..rag.ingest import IngestionJob
+from ..utils import get_current_user, ingestion_worker
 from ..db import User
 
 from ..clients.llm import LLM
+from ..state import get_llm
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
 
 @router.post("/epa/")
-async def get_daily_questions(file: UploadFile = File(...), user: User = Depends(get_current_user)):
+async def get_daily_questions(
+    file: UploadFile = File(...),
+    user: User = Depends(get_current_user),
+    llm: LLM = Depends(get_llm),
+):
     logger.debug(f"Received ePA for user: {user.username}")
     filename = file.filename
 
     contents = await file.read()
+    ingestion_worker.submit(user.username, filename or "epa", contents)
 
     messages = [
         {
@@ -32,6 +40,20 @@ Take the Data and create a detailed report of the patient health status that can
         },
     ]
 
-    llm = LLM()
-    response = llm.llm.invoke(input=messages)
+    response = await llm.llm.ainvoke(input=messages)
     print(response)
+
+
+@router.post("/")
+async def upload_document(file: UploadFile = File(...), user: User = Depends(get_current_user)) -> IngestionJob:
+    """Queue a PDF or text document for indexing in the user's own RAG namespace."""
+    contents = await file.read()
+    return ingestion_worker.submit(user.username, file.filename or "document", contents)
+
+
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(job_id: str, user: User = Depends(get_current_user)) -> IngestionJob:
+    job = ingestion_worker.get_job(job_id)
+    if job is None or job.username != user.username:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Job not found")
+    return job
@@ -10,13 +10,14 @@ from fastapi import (
     UploadFile,
 )
 
-from src.clients.llm import LLM
 from src.graphs.epa import EPAGraph
+from src.state import get_epa_graph
 from ..config import logger
 from http import HTTPStatus
 
-from src.db import UpdateUser, User, create_user, get_user, update_user
-from ..utils import get_current_user
+from src.db import UpdateUser, User
+from src.async_db import create_user, get_user, get_user_events, update_user
+from ..utils import get_current_user, ingestion_worker
 
 
 class RegisterUserDTO(TypedDict):
@@ -46,12 +47,13 @@ router = APIRouter(prefix="/users", tags=["users"])
 @router.get("/me")
 async def me(user: User = Depends(get_current_user)):
     logger.debug("me")
+    user.events = await get_user_events(user.username) or []
     return user
 
 
 @router.post("/register")
 async def register(data: RegisterUserDTO):
-    create_user(
+    await create_user(
         User(
             username=data["username"],
             password=data["password"],
@@ -72,16 +74,16 @@ async def setup(
     issues: str = Form(...),
     goal: str = Form(...),
     electronic_patient_record: UploadFile | None = File(None),
+    graph: EPAGraph = Depends(get_epa_graph),
 ):
     logger.info("/setup")
 
-    llm = LLM()
-    graph = EPAGraph(llm.llm)
-
     data = await electronic_patient_record.read() if electronic_patient_record else None
-    epa_summary = graph.run(data) if data else None
+    epa_summary = await graph.arun(data) if data else None
+    if data:
+        ingestion_worker.submit(user.username, electronic_patient_record.filename or "epa", data)
 
-    update_user(
+    await update_user(
         UpdateUser(
             username=user.username,
             first_name=first_name,
@@ -100,7 +102,7 @@ async def setup(
 
 @router.post("/login")
 async def login(data: LoginDTO, response: Response):
-    user = get_user(data["username"])
+    user = await get_user(data["username"])
     if user is None:
         raise HTTPException(status_code=HTTPStatus.BAD_REQUEST)
 
@@ -0,0 +1,103 @@
+"""Scheduled precomputation jobs, started together with the API.
+
+The daily questions and dashboards are generated off-peak so the first
+request of the day finds them ready. Each job spreads its users over
+SCHEDULER_WINDOW_MINUTES. When several API workers run the scheduler, a lock
+row in the database makes sure only one of them runs a given job.
+"""
+
+import os
+import socket
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from pydantic import BaseModel
+from . import async_db
+from .batch import BatchProgress, run_daily_dashboards, run_daily_questions
+from .config import CONFIG, logger
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobStatus(BaseModel):
+    job: str
+    running: bool = False
+    runs: int = 0
+    skipped_locked: int = 0
+    next_run_at: Optional[datetime] = None
+    last_started_at: Optional[datetime] = None
+    last_finished_at: Optional[datetime] = None
+    last_duration_seconds: Optional[float] = None
+    last_error: Optional[str] = None
+    last_progress: Optional[BatchProgress] = None
+
+
+job_status: Dict[str, JobStatus] = {}
+
+scheduler = AsyncIOScheduler()
+
+
+async def run_job(job: str, func: Callable[..., Awaitable[BatchProgress]]):
+    status = job_status.setdefault(job, JobStatus(job=job))
+    window = CONFIG["SCHEDULER_WINDOW_MINUTES"] * 60
+    # The lock outlives a normal run, and expires if its owner dies
+    if not await async_db.acquire_job_lock(job, OWNER, window + 3600):
+        status.skipped_locked += 1
+        logger.info(f"Job {job} is running on another worker, skipping")
+        return
+
+    status.running = True
+    status.last_started_at = datetime.now()
+    status.last_error = None
+    try:
+        status.last_progress = await func(spread=window)
+    except Exception as e:
+        status.last_error = str(e)
+        logger.error(f"Job {job} failed: {e}")
+    finally:
+        status.running = False
+        status.runs += 1
+        status.last_finished_at = datetime.now()
+        status.last_duration_seconds = (status.last_finished_at - status.last_started_at).total_seconds()
+        await async_db.release_job_lock(job, OWNER)
+
+
+def _daily_trigger(at: str) -> CronTrigger:
+    hour, minute = at.split(":")
+    return CronTrigger(hour=int(hour), minute=int(minute))
+
+
+JOBS = {
+    "daily_questions": (run_daily_questions, "SCHEDULER_DAILY_QUESTIONS_AT"),
+    "daily_dashboard": (run_daily_dashboards, "SCHEDULER_DAILY_DASHBOARD_AT"),
+}
+
+
+def start_scheduler():
+    for job, (func, setting) in JOBS.items():
+        job_status.setdefault(job, JobStatus(job=job))
+        scheduler.add_job(
+            run_job,
+            _daily_trigger(CONFIG[setting]),
+            args=[job, func],
+            id=job,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=3600,
+        )
+    scheduler.start()
+    logger.info(f"Scheduler started with jobs: {', '.join(JOBS)}")
+
+
+def stop_scheduler():
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+
+
+def get_job_status() -> Dict[str, JobStatus]:
+    for job in job_status.values():
+        scheduled = scheduler.get_job(job.job) if scheduler.running else None
+        job.next_run_at = scheduled.next_run_time if scheduled else None
+    return job_status
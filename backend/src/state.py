@@ -1,8 +1,17 @@
+"""Clients and compiled graphs shared by the whole process.
+
+Everything here is built once at import. Routes get them through the FastAPI
+dependencies below instead of constructing their own, so requests reuse the
+Bedrock client's connection pool and the compiled graphs.
+"""
+
 from .clients.llm import LLM
 from .graphs.chatgraph import ChatGraph
 from .graphs.questionsgraph import QuestionsGraph
 from .graphs.dietgraph import DietGraph
 from .graphs.summarizationgraph import SummarizationGraph
+from .graphs.dashboardgraph import DashboardGraph
+from .graphs.epa import EPAGraph
 from .config import logger
 
 try:
@@ -11,7 +20,21 @@ try:
     questions_graph = QuestionsGraph(llm.llm)
     diet_graph = DietGraph(llm.llm)
     summarization_graph = SummarizationGraph(llm.llm)
+    dashboard_graph = DashboardGraph(llm.llm)
+    epa_graph = EPAGraph(llm.llm)
     logger.info("API components initialized")
 except Exception as e:
     logger.error(f"Failed to initialize API components: {e}")
     raise
+
+
+def get_llm() -> LLM:
+    return llm
+
+
+def get_dashboard_graph() -> DashboardGraph:
+    return dashboard_graph
+
+
+def get_epa_graph() -> EPAGraph:
+    return epa_graph
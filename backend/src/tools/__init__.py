@@ -1,3 +1,3 @@
 from .rag import retrieve_context
 from .calendar import get_calendar, add_calendar_event, remove_calendar_event, edit_calendar_event, get_calendar_events_between_timestamps
-from .diet import add_meal_to_calendar, get_meals_for_day, edit_meal, remove_meal
\ No newline at end of file
+from .diet import add_meal_to_calendar, add_meals_bulk, replace_meals_for_range, get_meals_for_day, edit_meal, remove_meal
\ No newline at end of file
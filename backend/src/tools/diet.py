@@ -1,18 +1,35 @@
 from langchain.tools import tool
+from langchain_core.tools import InjectedToolArg
 import json
 from datetime import datetime, timedelta
+from typing import Annotated, List, Tuple
+from pydantic import BaseModel, Field
 from ..config import logger
+from ..db import add_events_bulk, replace_events_between
 from .calendar import add_calendar_event, get_calendar_events_between_timestamps, edit_calendar_event, remove_calendar_event
 
+MEAL_PREFIX = "Diet - "
+
+
+class Meal(BaseModel):
+    meal_type: str = Field(description="breakfast, lunch, dinner or snack")
+    description: str
+    date: str = Field(description="YYYY-MM-DD")
+    time: str = Field(description="HH:MM")
+
+
+def _meal_event(meal: Meal) -> Tuple[str, datetime, datetime]:
+    from_dt = datetime.fromisoformat(f"{meal.date}T{meal.time}")
+    to_dt = from_dt + timedelta(minutes=30)  # assume 30 min meal
+    return f"{MEAL_PREFIX}{meal.meal_type.capitalize()}: {meal.description}", from_dt, to_dt
+
 
 @tool()
 def add_meal_to_calendar(username: str, meal_type: str, description: str, date: str, time: str):
-    """Add a meal to the user's calendar. meal_type: breakfast, lunch, dinner, snack. date: YYYY-MM-DD, time: HH:MM"""
+    """Add a single meal to the user's calendar. To add several meals use add_meals_bulk. meal_type: breakfast, lunch, dinner, snack. date: YYYY-MM-DD, time: HH:MM"""
     logger.debug(f"Adding meal for user: {username}")
     try:
-        from_dt = datetime.fromisoformat(f"{date}T{time}")
-        to_dt = from_dt + timedelta(minutes=30)  # assume 30 min meal
-        full_desc = f"Diet - {meal_type.capitalize()}: {description}"
+        full_desc, from_dt, to_dt = _meal_event(Meal(meal_type=meal_type, description=description, date=date, time=time))
         result = add_calendar_event.run({
             "username": username,
             "description": full_desc,
@@ -39,7 +56,7 @@ def get_meals_for_day(username: str, date: str):
             "to_timestamp": end.isoformat()
         })
         data = json.loads(events)
-        diet_events = [e for e in data["events"] if e["description"].startswith("Diet - ")]
+        diet_events = [e for e in data["events"] if e["description"].startswith(MEAL_PREFIX)]
         logger.info(f"Retrieved {len(diet_events)} meals for user: {username}")
         return json.dumps({"username": username, "meals": diet_events})
     except Exception as e:
@@ -52,9 +69,7 @@ def edit_meal(username: str, event_id: str, meal_type: str, description: str, da
     """Edit a diet meal. meal_type: breakfast, lunch, dinner, snack. date: YYYY-MM-DD, time: HH:MM"""
     logger.debug(f"Editing meal {event_id} for user: {username}")
     try:
-        from_dt = datetime.fromisoformat(f"{date}T{time}")
-        to_dt = from_dt + timedelta(minutes=30)
-        full_desc = f"Diet - {meal_type.capitalize()}: {description}"
+        full_desc, from_dt, to_dt = _meal_event(Meal(meal_type=meal_type, description=description, date=date, time=time))
         result = edit_calendar_event.run({
             "username": username,
             "event_id": event_id,
@@ -79,4 +94,49 @@ def remove_meal(username: str, event_id: str):
         return result
     except Exception as e:
         logger.error(f"Error removing meal {event_id} for user {username}: {e}")
-        return f"Error removing meal: {str(e)}"
\ No newline at end of file
+        return f"Error removing meal: {str(e)}"
+
+
+@tool()
+def add_meals_bulk(username: Annotated[str, InjectedToolArg], meals: List[Meal]):
+    """Add many meals to the user's calendar at once, e.g. a whole diet plan. Prefer this over repeated add_meal_to_calendar calls."""
+    # username is bound to the authenticated user by the tool loop, never chosen by the model
+    logger.debug(f"Adding {len(meals)} meals for user: {username}")
+    try:
+        events = add_events_bulk(username, [_meal_event(meal) for meal in meals])
+        if events is None:
+            logger.warning(f"User not found: {username}")
+            return f"User {username} not found"
+        logger.info(f"Added {len(events)} meals for user: {username}")
+        return json.dumps({"username": username, "added": [event.id for event in events]})
+    except ValueError as e:
+        logger.error(f"Invalid meal date or time: {e}")
+        return "Invalid date or time. Use YYYY-MM-DD for date and HH:MM for time"
+    except Exception as e:
+        logger.error(f"Error adding meals for user {username}: {e}")
+        return f"Error adding meals: {str(e)}"
+
+
+@tool()
+def replace_meals_for_range(username: Annotated[str, InjectedToolArg], start_date: str, end_date: str, meals: List[Meal]):
+    """Replace all diet meals from start_date to end_date (both YYYY-MM-DD, inclusive) with the given meals. Use this to write or rewrite a diet plan in one step."""
+    # username is bound to the authenticated user by the tool loop, never chosen by the model
+    logger.debug(f"Replacing meals from {start_date} to {end_date} for user: {username}")
+    try:
+        start = datetime.fromisoformat(f"{start_date}T00:00")
+        end = datetime.fromisoformat(f"{end_date}T00:00") + timedelta(days=1)
+        result = replace_events_between(
+            username, start, end, [_meal_event(meal) for meal in meals], MEAL_PREFIX
+        )
+        if result is None:
+            logger.warning(f"User not found: {username}")
+            return f"User {username} not found"
+        removed, events = result
+        logger.info(f"Replaced {removed} meals with {len(events)} for user: {username}")
+        return json.dumps({"username": username, "removed": removed, "added": [event.id for event in events]})
+    except ValueError as e:
+        logger.error(f"Invalid meal date or time: {e}")
+        return "Invalid date or time. Use YYYY-MM-DD for dates and HH:MM for time"
+    except Exception as e:
+        logger.error(f"Error replacing meals for user {username}: {e}")
+        return f"Error replacing meals: {str(e)}"
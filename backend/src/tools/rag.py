@@ -1,14 +1,20 @@
+from typing import Annotated
 from langchain.tools import tool
+from langchain_core.tools import InjectedToolArg
 from ..config import logger
-from ..utils import vector_store
+from ..rag.index import SHARED_NAMESPACE, user_namespace
+from ..utils import retriever
 
 
 @tool()
-def retrieve_context(query: str):
-    """Retrieve information to help answer a query."""
-    logger.debug(f"Retrieving context for query: {query}")
+def retrieve_context(query: str, username: Annotated[str, InjectedToolArg]):
+    """Retrieve information to help answer a query from the medical corpus and the user's own documents."""
+    # username is bound to the authenticated user by the tool loop, never chosen by the model
+    logger.debug(f"Retrieving context for user {username} and query: {query}")
     try:
-        retrieved_docs = vector_store.similarity_search(query, k=2)
+        retrieved_docs = retriever.search(
+            query, k=2, where={"namespace": [SHARED_NAMESPACE, user_namespace(username)]}
+        )
         logger.debug(f"Retrieved {len(retrieved_docs)} documents")
         if not retrieved_docs:
             logger.warning("No documents retrieved for query")
@@ -16,4 +22,4 @@ def retrieve_context(query: str):
         return serialized
     except Exception as e:
         logger.error(f"Error during retrieval: {e}")
-        return "Error retrieving context"
\ No newline at end of file
+        return "Error retrieving context"
@@ -0,0 +1,86 @@
+"""In-process cache of the users resolved by get_current_user.
+
+Entries are keyed by the session cookie, expire after USER_CACHE_TTL seconds
+and are evicted least recently used beyond USER_CACHE_SIZE. Every db function
+that changes a user's data calls invalidate. Changes made outside this process,
+and the daily rollover of needs_daily_questions, show up within the TTL.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from .config import CONFIG
+
+if TYPE_CHECKING:
+    from .db import User
+
+
+class UserCache:
+    """Thread-safe LRU cache of User objects with a time to live."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, Tuple[float, User]] = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        """Changes on every invalidation; pass it to put to avoid caching stale reads."""
+        return self._generation
+
+    def get(self, session: str) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(session)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[session]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session)
+            self.hits += 1
+        # Routes may set fields such as events on their user, so hand out copies
+        return entry[1].model_copy()
+
+    def put(self, session: str, user: User, generation: Optional[int] = None):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            # Skip users read before an invalidation finished, they may be stale
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[session] = (time.monotonic() + self.ttl, user.model_copy())
+            self._entries.move_to_end(session)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._generation += 1
+            for session in [
+                session for session, (_, user) in self._entries.items() if user.username == username
+            ]:
+                del self._entries[session]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+user_cache = UserCache(CONFIG["USER_CACHE_SIZE"], CONFIG["USER_CACHE_TTL"])
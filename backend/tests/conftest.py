@@ -0,0 +1,15 @@
+import os
+import tempfile
+import time
+
+# Storage goes to a throwaway directory, and the server runs east of UTC so
+# that any UTC/local mix-up in event times shows up as a shifted wall time.
+_directory = tempfile.mkdtemp(prefix="tests-")
+os.environ.setdefault("DB_PATH", os.path.join(_directory, "test.db"))
+os.environ.setdefault("RAG_INDEX_DIR", os.path.join(_directory, "rag_index"))
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(_directory, "embeddings_cache.db"))
+os.environ.setdefault("EMBEDDING_MODEL", "local")
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+os.environ["TZ"] = "Asia/Tokyo"
+time.tzset()
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src import db
+
+
+@pytest.fixture(scope="module")
+def username():
+    db.init_db()
+    db.create_user(db.User(username="events-test", password="password", status="finished"))
+    return "events-test"
+
+
+def test_naive_event_reads_back_unchanged(username):
+    start = datetime(2026, 3, 1, 23, 45)
+    end = start + timedelta(minutes=30)
+
+    created = db.add_event(username, "Dinner", start, end)
+    [stored] = [event for event in db.get_user_events(username) if event.id == created.id]
+
+    assert (stored.from_timestamp, stored.to_timestamp) == (start, end)
+    assert (created.from_timestamp, created.to_timestamp) == (start, end)
+
+
+def test_aware_event_reads_back_as_local_wall_time(username):
+    start = datetime(2026, 3, 2, 8, 0, tzinfo=timezone.utc)
+
+    created = db.add_event(username, "Breakfast", start, start + timedelta(hours=1))
+    [stored] = [event for event in db.get_user_events(username) if event.id == created.id]
+
+    assert stored.from_timestamp == datetime(2026, 3, 2, 17, 0)
+    assert stored.from_timestamp.tzinfo is None